@@ -0,0 +1,167 @@
+"""Command line interface, run ''python -m autoria --help''."""
+
+import argparse
+import json
+import threading
+from typing import List
+
+from autoria import fake, loadtest, server, workqueue
+from autoria.api import CachingRiaAPI, RiaAPI
+from autoria.keys import ApiKeyPool
+
+
+def _fake_server(args: argparse.Namespace,
+                 address: tuple) -> fake.FakeRiaServer:
+    catalog = fake.FakeCatalog(
+        marks=args.marks, models=args.models,
+        prices=(args.min_prices, args.max_prices), seed=args.seed)
+    return fake.FakeRiaServer(
+        address, catalog,
+        latency=fake.lognormal_latency(
+            args.latency_median / 1000, args.latency_sigma)
+        if args.latency_median else None,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        quota=args.quota, seed=args.seed)
+
+
+def main(argv: List[str] = None) -> None:
+    """Parse command line arguments and run the selected command."""
+    parser = argparse.ArgumentParser(prog='autoria')
+    commands = parser.add_subparsers(dest='command')
+
+    serve = commands.add_parser(
+        'serve', help='run warm average price server')
+    serve.add_argument('--host', default=server.DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=server.DEFAULT_PORT)
+    serve.add_argument('--api-url', help='auto.ria.com API base url')
+    serve.add_argument('--api-key', action='append', dest='api_keys',
+                       help='API key to use, may be repeated')
+    serve.add_argument('--cache-ttl', type=float,
+                       help='seconds to keep reference data for')
+    serve.add_argument('--no-warm', action='store_true',
+                       help='do not prefetch reference data on start')
+    serve.add_argument('--verbose', action='store_true')
+
+    enqueue = commands.add_parser(
+        'enqueue', help='add searches to a work queue')
+    enqueue.add_argument('queue', help='queue database path')
+    enqueue.add_argument(
+        'searches', help='JSON lines file with searches like '
+        '{"task_id": "...", "params": {...}}')
+
+    work = commands.add_parser(
+        'work', help='process searches from a work queue')
+    work.add_argument('queue', help='queue database path')
+    work.add_argument('shard', help='file to append results to')
+    work.add_argument('--worker-id')
+    work.add_argument('--batch-size', type=int, default=10)
+    work.add_argument('--lease-timeout', type=float, default=300.0)
+    work.add_argument('--api-key', action='append', dest='api_keys',
+                      help='API key to use, may be repeated')
+
+    requeue = commands.add_parser(
+        'requeue', help='return failed searches to a work queue')
+    requeue.add_argument('queue', help='queue database path')
+
+    merge = commands.add_parser(
+        'merge', help='merge result shards of workers')
+    merge.add_argument('output', help='merged results path')
+    merge.add_argument('shards', nargs='+', help='shard paths')
+
+    fake_options = argparse.ArgumentParser(add_help=False)
+    fake_options.add_argument('--marks', type=int, default=100)
+    fake_options.add_argument('--models', type=int, default=30)
+    fake_options.add_argument('--min-prices', type=int, default=10)
+    fake_options.add_argument('--max-prices', type=int, default=500)
+    fake_options.add_argument('--latency-median', type=float, default=0,
+                              help='median response delay, ms')
+    fake_options.add_argument('--latency-sigma', type=float, default=0.5)
+    fake_options.add_argument('--error-rate', type=float, default=0.0)
+    fake_options.add_argument('--throttle-rate', type=float, default=0.0)
+    fake_options.add_argument('--quota', type=int,
+                              help='requests allowed per API key')
+    fake_options.add_argument('--seed', type=int, default=0)
+
+    fake_server = commands.add_parser(
+        'fake-server', parents=[fake_options],
+        help='run synthetic auto.ria.com API server')
+    fake_server.add_argument('--host', default='127.0.0.1')
+    fake_server.add_argument('--port', type=int, default=8766)
+
+    load = commands.add_parser(
+        'loadtest', parents=[fake_options],
+        help='measure search throughput and latency')
+    load.add_argument('--api-url',
+                      help='API to test, in-process fake server if not given')
+    load.add_argument('--searches', type=int, default=1000)
+    load.add_argument('--concurrency', type=int, default=8)
+    load.add_argument('--no-cache', action='store_true',
+                      help='do not cache reference data')
+    load.add_argument('--api-key', action='append', dest='api_keys',
+                      help='API key to use, may be repeated')
+    load.add_argument('--key-cooldown', type=float, default=60.0,
+                      help='seconds to skip a throttled API key')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        server.serve(args.host, args.port, api_url=args.api_url,
+                     api_keys=args.api_keys, cache_ttl=args.cache_ttl,
+                     warm=not args.no_warm, verbose=args.verbose)
+    elif args.command == 'enqueue':
+        queue = workqueue.SqliteWorkQueue(args.queue)
+        with open(args.searches, encoding='utf-8') as searches:
+            tasks = (json.loads(line) for line in searches if line.strip())
+            added = queue.put(
+                (task['task_id'], task['params']) for task in tasks)
+        print('Added {} searches, {}'.format(added, queue.counts()))
+    elif args.command == 'work':
+        queue = workqueue.SqliteWorkQueue(
+            args.queue, lease_timeout=args.lease_timeout)
+        api = CachingRiaAPI(key_pool=ApiKeyPool(args.api_keys)
+                            if args.api_keys else None)
+        completed = workqueue.run_worker(
+            queue, args.shard, worker_id=args.worker_id, api=api,
+            batch_size=args.batch_size)
+        print('Completed {} searches, {}'.format(completed, queue.counts()))
+    elif args.command == 'requeue':
+        queue = workqueue.SqliteWorkQueue(args.queue)
+        requeued = queue.requeue_failed()
+        print('Requeued {} searches, {}'.format(requeued, queue.counts()))
+    elif args.command == 'fake-server':
+        fake_api = _fake_server(args, (args.host, args.port))
+        print('Serving fake API at {}'.format(fake_api.url))
+        try:
+            fake_api.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fake_api.server_close()
+    elif args.command == 'loadtest':
+        fake_api = None
+        api_url = args.api_url
+        if api_url is None:
+            fake_api = _fake_server(args, ('127.0.0.1', 0))
+            threading.Thread(target=fake_api.serve_forever,
+                             daemon=True).start()
+            api_url = fake_api.url
+        key_pool = ApiKeyPool(args.api_keys, cooldown=args.key_cooldown) \
+            if args.api_keys else None
+        tested_api = RiaAPI(api_url, key_pool) if args.no_cache \
+            else CachingRiaAPI(api_url, key_pool)
+        generated = fake.FakeCatalog(
+            marks=args.marks, models=args.models,
+            seed=args.seed).searches(args.searches)
+        print(loadtest.run_load_test(
+            tested_api, generated, args.concurrency).summary())
+        if fake_api is not None:
+            fake_api.shutdown()
+            fake_api.server_close()
+    elif args.command == 'merge':
+        results = workqueue.merge_shards(args.shards, args.output)
+        print('Merged {} results'.format(len(results)))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
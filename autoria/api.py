@@ -7,10 +7,19 @@ average used car prices that are sold on http://auto.ria.com
 
 import requests
 import json
-from fnmatch import fnmatch
-from typing import Any, Dict, List
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple  # noqa: F401
 from collections import namedtuple
 
+from autoria.keys import ApiKeyPool, QuotaExceeded
+from autoria.planner import ResolutionPlan
+# Selection functions used to live here, they are kept importable
+from autoria.selection import (  # noqa: F401
+    select_item, select_list, select_many)
+
+API_URL = 'http://api.auto.ria.com'
+
 
 class RiaAPI:
     """Python auto.ria.com API.
@@ -20,9 +29,20 @@ class RiaAPI:
     send a request to calculate average price
     """
 
-    def __init__(self):
-        """Constructor."""
-        self._api_url = 'http://api.auto.ria.com{method}'
+    def __init__(self, api_url: str = API_URL,
+                 key_pool: ApiKeyPool = None) -> None:
+        """Constructor.
+
+        Args:
+            api_url - base url of the API, without trailing slash
+            key_pool - pool of API keys, if given, every request
+                is sent with ''api_key'' picked from the pool
+        """
+        self._api_url = api_url + '{method}'
+        self._key_pool = key_pool
+        # A session keeps connections alive between requests, which
+        # matters for long-living instances making many requests
+        self._session = requests.Session()
 
     def _make_request(
             self, url: str, parameters: dict = None) -> Any:
@@ -34,16 +54,59 @@ class RiaAPI:
 
         Returns:
             List of dictionaries with response text.
+
+        Raises:
+            QuotaExceeded if the request is throttled.
         """
         req_url = self._api_url.format(method=url)
-        response = requests.get(url=req_url, params=parameters)
+        if self._key_pool is None:
+            response = self._session.get(url=req_url, params=parameters)
+        else:
+            response = self._make_pooled_request(req_url, parameters)
         if response.status_code == 200:
             return json.loads(response.text)
+        elif response.status_code == 429:
+            raise QuotaExceeded(
+                'Error making a request to: {}, response: {}, {}'
+                .format(url, response.status_code, response.text))
         else:
             raise Exception(
                 'Error making a request to: {}, response: {}, {}'
                 .format(url, response.status_code, response.text))
 
+    @property
+    def key_pool(self) -> Optional[ApiKeyPool]:
+        """Pool of API keys, ''None'' if requests are sent without keys."""
+        return self._key_pool
+
+    def _make_pooled_request(
+            self, req_url: str, parameters: dict = None
+    ) -> requests.Response:
+        """Send get request with a key from the key pool.
+
+        If the request is throttled, it is retried with another key,
+        each key of the pool is tried at most once.
+        """
+        key_pool = self._key_pool
+        if key_pool is None:
+            raise Exception('No API key pool to make a request with')
+        for _ in range(len(key_pool)):
+            key = key_pool.acquire()
+            try:
+                response = self._session.get(
+                    url=req_url, params=dict(parameters or {}, api_key=key))
+            except requests.RequestException:
+                key_pool.report(key, 599)
+                raise
+            remaining = response.headers.get('X-RateLimit-Remaining')
+            key_pool.report(
+                key, response.status_code,
+                int(remaining) if remaining is not None and
+                remaining.isdigit() else None)
+            if response.status_code != 429:
+                break
+        return response
+
     def get_categories(self) -> List[Dict[str, Any]]:
         """Get available vehicle types from auto.ria.com.
 
@@ -273,6 +336,75 @@ class RiaAPI:
         return self._make_request('/average', parameters)
 
 
+class CachingRiaAPI(RiaAPI):
+    """RiaAPI keeping reference data in memory.
+
+    All the ''get_'' lists (categories, marks, states etc.) change
+    rarely, so once fetched they are kept for ''ttl'' seconds, or for
+    the lifetime of the instance if ''ttl'' is not given. Average price
+    requests are never cached.
+    """
+
+    def __init__(self, api_url: str = API_URL,
+                 key_pool: ApiKeyPool = None, ttl: float = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """Constructor, see ''RiaAPI'' for the first arguments.
+
+        Args:
+            ttl - seconds to keep fetched lists for, forever if not given
+            clock - function returning current time in seconds
+        """
+        super().__init__(api_url, key_pool)
+        self._ttl = ttl
+        self._clock = clock
+        self._cache = {}  # type: Dict[str, Tuple[float, Any]]
+        self._lock = threading.Lock()
+
+    def _make_request(
+            self, url: str, parameters: dict = None) -> Any:
+        """Send get request or return previously fetched data.
+
+        Only requests without GET parameters are cached, see
+        ''RiaAPI._make_request'' for arguments.
+        """
+        if parameters is not None:
+            return super()._make_request(url, parameters)
+        with self._lock:
+            if self._is_fresh(url):
+                return self._cache[url][1]
+        data = super()._make_request(url)
+        with self._lock:
+            self._cache[url] = (self._clock(), data)
+        return data
+
+    def is_cached(self, url: str) -> bool:
+        """Check whether data for the given url is already fetched."""
+        with self._lock:
+            return self._is_fresh(url)
+
+    def clear_cache(self) -> None:
+        """Forget all previously fetched data."""
+        with self._lock:
+            self._cache.clear()
+
+    def _is_fresh(self, url: str) -> bool:
+        if url not in self._cache:
+            return False
+        if self._ttl is None:
+            return True
+        return self._clock() - self._cache[url][0] < self._ttl
+
+    def warm(self) -> None:
+        """Prefetch lists which do not depend on any identifier."""
+        self.get_categories()
+        self.get_states()
+        self.get_fuels()
+        self.get_colors()
+
+
+# Search parameters which RiaAverageCarPrice can't do without
+REQUIRED_SEARCH_PARAMS = ('category', 'mark', 'model')
+
 RiaAverageCarPriceParams = namedtuple('RiaAverageCarPriceParams', [
     'api_key',
     'main_category',
@@ -307,7 +439,8 @@ class RiaAverageCarPrice:
     the request for average price is sent using RiaAPI class.
     """
 
-    def __init__(self, api_key: str, category: str, mark: str, model: str,
+    def __init__(self, api_key: str = None, category: str = None,
+                 mark: str = None, model: str = None,
                  bodystyle: str = None, years: list = None,
                  state: str = None, city: str = None,
                  gears: list = None, opts: list = None,
@@ -317,15 +450,22 @@ class RiaAverageCarPrice:
                  seats: int = None, doors: int = None,
                  carrying: int = None, custom: bool = False,
                  damage: bool = False, under_credit: bool = False,
-                 confiscated: bool = False, on_repair_parts: bool = False
-                 ) -> None:
+                 confiscated: bool = False, on_repair_parts: bool = False,
+                 api: RiaAPI = None) -> None:
         """Constructor.
 
         Compose parameters for GET request to auro.ria.com API.
         Acceps the following search parameters.
 
+        Any of category, mark, model, bodystyle, state, city, color
+        and lists of gears, opts, fuels, drives could be given as
+        identifiers instead of names, that saves requests for lists
+        to select identifiers from. Requests needed are made in
+        parallel, see ''autoria.planner.ResolutionPlan''.
+
         Args:
             api_key - your api_key, to get it register on https://developers.ria.com/
+                could be omitted if ''api'' has a key pool
             category - vehicle type, e.g. ''Легковые''
             mark - mark, like ''Renault''
             model - model, like ''Scenic''
@@ -358,36 +498,26 @@ class RiaAverageCarPrice:
             credit - is the car under credit?
             confiscated - is the car confiscated?
             on_repair_parts - is the car is broken?
+            api - RiaAPI instance to make requests with, a new one
+                is created if not given, pass ''CachingRiaAPI''
+                to share reference data between searches
         """
-        self._api = RiaAPI()
-        # Processing required args
-        # Getting the list of categories and selecting needed id
-        category_id = select_item(category, self._api.get_categories())
-        # Getting the list of marks and selecting needed id
-        mark_id = select_item(mark, self._api.get_marks(category_id))
-        # Getting the list of models and selecting neede id
-        model_id = select_item(
-            model,
-            self._api.get_models(category_id, mark_id)
-        )
-
-        # Processing the rest of args, those which are defaulted to None
-        # are processed below
+        missing = [name for name, value in zip(
+            REQUIRED_SEARCH_PARAMS, (category, mark, model)) if value is None]
+        if missing:
+            raise TypeError('Missing required search parameters: {}'.format(
+                ', '.join(missing)))
+        self._api = api if api is not None else RiaAPI()
+        if api_key is None and self._api.key_pool is None:
+            raise Exception('api_key is required if api has no key pool')
+        self.plan = ResolutionPlan(
+            self._api, category=category, mark=mark, model=model,
+            bodystyle=bodystyle, state=state, city=city, gears=gears,
+            opts=opts, fuels=fuels, drives=drives, color=color)
         self._params = RiaAverageCarPriceParams(
             api_key=api_key,
-            main_category=category_id,
-            marka_id=mark_id,
-            model_id=model_id,
-            state_id=None,
-            body_id=None,
-            city_id=None,
             yers=years,
             raceInt=mileage,
-            gear_id=None,
-            options=None,
-            fuel_id=None,
-            drive_id=None,
-            color_id=None,
             engineVolume=engine_volume if engine_volume else None,
             seats=seats if seats else None,
             door=doors if doors else None,
@@ -397,122 +527,9 @@ class RiaAverageCarPrice:
             under_credit=under_credit if under_credit else None,
             confiscated_car=confiscated if confiscated else None,
             onRepairParts=on_repair_parts if on_repair_parts else None,
+            **self.plan.execute()
         )
 
-        if state is not None:
-            # state_id variable is needed below, whice selecting a city
-            state_id = select_item(state, self._api.get_states())
-            self._params = self._params._replace(state_id=state_id)
-
-        if bodystyle is not None:
-            self._params = self._params._replace(body_id=select_item(
-                bodystyle,
-                self._api.get_bodystyles(category_id)
-            ))
-
-        if city is not None and state is not None:
-            self._params = self._params._replace(city_id=select_item(
-                city,
-                self._api.get_cities(state_id)
-            ))
-
-        if gears is not None:
-            self._params = self._params._replace(gear_id=select_list(
-                gears,
-                self._api.get_gearboxes(category_id)
-            ))
-
-        if opts is not None:
-            self._params = self._params._replace(options=select_list(
-                opts,
-                self._api.get_options(category_id)
-            ))
-
-        if fuels is not None:
-            self._params = self._params._replace(fuel_id=select_list(
-                fuels, self._api.get_fuels()
-            ))
-
-        if drives is not None:
-            self._params = self._params._replace(drive_id=select_list(
-                drives,
-                self._api.get_driver_types(category_id)
-            ))
-
-        if color is not None:
-            self._params = self._params._replace(color_id=select_item(
-                color,
-                self._api.get_colors()
-            ))
-
     def get_average(self) -> dict:
         """Get average price for composed search parameters."""
         return self._api.average_price(self._params._asdict())
-
-
-def select_item(item_to_select: str, items_list: list) -> int:
-        """Select vehicle type, bodystyle, mark, model from the given list.
-
-        This function is intended to convert human-readable search
-        parameter, for instance, ''Винница'' into API-understandable
-        state identifier, for the given example it would be 1.
-
-        Args:
-            item_to_select - could be not 100% accurate as it is in the
-                auto.ria.ua lists, e.g. value ''Харьков'' is acceptable,
-                because the parameter is wild-carded in comprasion like
-                ''*Харьков*'', the function will find suitable name
-                ''Харьковская'' and will return its id.
-            items_list - JSON-formatted list of pairs ''name: value'',
-                    obtained from one of the ''get_'' functions.
-
-        Returns:
-            needed item (category, bodystyle, mark etc.) identifyer.
-        """
-        if item_to_select is not None and items_list is not None:
-            for item in items_list:
-                if fnmatch(item['name'], item_to_select):
-                    return item['value']
-            for item in items_list:
-                if fnmatch(item['name'], '{}*'.format(item_to_select)):
-                    return item['value']
-            for item in items_list:
-                if fnmatch(item['name'], '*{}*'.format(item_to_select)):
-                    return item['value']
-
-
-def select_list(list_to_select: list, items_list: list) -> list:
-    """Select a list of ids in the list of dictionaries.
-
-    The function is intended to select a list of options inside
-    the list of dictionaries returned by any ''get_'' method of
-    RiaAPI.
-    For example, we have:
-        gears=['Ручная / Механика', 'Автомат']
-    as a search parameter, we need to:
-    1. Get a list of dictionaries (happens not in this function)
-    2. Define ids of provided options (happens right here)
-
-    Args:
-        list_to_select - a list of options to select, for instance,
-                ['Ручная / Механика', 'Автомат']
-        items_list - list of dictionaries with option names and ids,
-        for example:
-            [
-                {
-                name: "Ручная / Механика",
-                value: 1
-                },
-                ...
-            ]
-
-    Returns:
-        The list of ids, ready-to-use in other methods, for example:
-            [1, 2]
-    """
-    if list_to_select is not None:
-        selected_list = []
-        for item in list_to_select:
-            selected_item = select_item(item, items_list)
-            selected_list.append(selected_item)
-        return selected_list
@@ -0,0 +1,281 @@
+"""Synthetic auto.ria.com API server.
+
+''FakeRiaServer'' implements every API method ''RiaAPI'' calls on top
+of a generated ''FakeCatalog'', with configurable latency, error and
+throttling rates and payload sizes. It is intended for load testing
+and tuning clients without touching the real API:
+
+    server = FakeRiaServer(('127.0.0.1', 0), FakeCatalog(marks=200))
+    api = RiaAPI(server.url)
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import (  # noqa: F401
+    Any, Callable, Dict, List, Pattern, Tuple, cast)
+from urllib.parse import parse_qs, urlparse
+
+from autoria.httpserver import JsonRequestHandler, ThreadingJsonServer
+
+LatencyFunction = Callable[[random.Random], float]
+
+
+def constant_latency(seconds: float) -> LatencyFunction:
+    """Every response is delayed by the same number of seconds."""
+    return lambda rnd: seconds
+
+
+def lognormal_latency(median: float, sigma: float = 0.5) -> LatencyFunction:
+    """Response delay is log-normally distributed.
+
+    Args:
+        median - median delay in seconds
+        sigma - standard deviation of the delay logarithm, the larger
+            it is, the longer is the tail
+    """
+    return lambda rnd: rnd.lognormvariate(math.log(median), sigma)
+
+
+def _named_list(name: str, count: int, start: int = 1
+                ) -> List[Dict[str, Any]]:
+    return [{'name': name.format(i), 'value': start + i}
+            for i in range(count)]
+
+
+class FakeCatalog:
+    """Generated reference data and average prices.
+
+    Names are like ''Mark 3'' or ''Model 3-7'' (7th model of 3rd mark),
+    ''searches'' generates search parameters matching the catalog.
+    The same seed always gives the same catalog.
+    """
+
+    def __init__(self, categories: int = 3, marks: int = 100,
+                 models: int = 30, states: int = 25, cities: int = 40,
+                 options: int = 100, prices: Tuple[int, int] = (10, 500),
+                 seed: int = 0) -> None:
+        """Constructor.
+
+        Args:
+            categories - number of vehicle categories
+            marks - number of marks in every category
+            models - number of models of every mark
+            states - number of states
+            cities - number of cities in every state
+            options - number of options in every category
+            prices - minimum and maximum number of prices in
+                average price results, defines payload size
+            seed - random generator seed
+        """
+        self.seed = seed
+        self._marks = marks
+        self._models = models
+        self._cities = cities
+        self._prices = prices
+        self.categories = _named_list('Category {}', categories)
+        self.states = _named_list('State {}', states)
+        self.fuels = _named_list('Fuel {}', 8)
+        self.colors = _named_list('Color {}', 20)
+        self.bodystyles = _named_list('Bodystyle {}', 20)
+        self.gearboxes = _named_list('Gearbox {}', 5)
+        self.driver_types = _named_list('Drive {}', 4)
+        self.options = _named_list('Option {}', options)
+
+    def marks(self, category: int) -> List[Dict[str, Any]]:
+        """Marks of the category."""
+        return _named_list('Mark {}', self._marks)
+
+    def models(self, category: int, mark: int) -> List[Dict[str, Any]]:
+        """Models of the mark, identifiers are unique across marks."""
+        return _named_list('Model {}-'.format(mark - 1) + '{}',
+                           self._models, start=mark * self._models)
+
+    def cities(self, state: int) -> List[Dict[str, Any]]:
+        """Cities of the state, identifiers are unique across states."""
+        return _named_list('City {}-'.format(state - 1) + '{}',
+                           self._cities, start=state * self._cities)
+
+    def average(self, parameters: Dict[str, List[str]]) -> dict:
+        """Average price result for GET parameters of the request.
+
+        The same parameters always give the same result.
+        """
+        key = json.dumps(sorted(
+            (k, v) for k, v in parameters.items() if k != 'api_key'))
+        rnd = random.Random('{}:{}'.format(self.seed, key))
+        base = rnd.uniform(3000, 40000)
+        prices = sorted(
+            round(rnd.lognormvariate(math.log(base), 0.3), 2)
+            for _ in range(rnd.randint(*self._prices)))
+        quarter = len(prices) // 4
+        middle = prices[quarter:len(prices) - quarter] or prices
+        return {
+            'arithmeticMean': sum(prices) / len(prices),
+            'interQuartileMean': sum(middle) / len(middle),
+            'percentiles': {
+                '{:.1f}'.format(q): prices[min(
+                    int(q / 100 * len(prices)), len(prices) - 1)]
+                for q in (1, 5, 25, 50, 75, 95, 99)
+            },
+            'prices': prices,
+            'classifieds': [rnd.randint(10000000, 30000000)
+                            for _ in prices],
+            'total': len(prices),
+        }
+
+    def searches(self, count: int, seed: int = None) -> List[dict]:
+        """Generate ''RiaAverageCarPrice'' arguments matching the catalog.
+
+        Args:
+            count - number of searches
+            seed - random generator seed, catalog seed by default
+        """
+        rnd = random.Random(self.seed if seed is None else seed)
+        searches = []
+        for _ in range(count):
+            mark = rnd.randrange(self._marks)
+            search = {
+                'api_key': 'fake',
+                'category': rnd.choice(self.categories)['name'],
+                'mark': 'Mark {}'.format(mark),
+                'model': 'Model {}-{}'.format(
+                    mark, rnd.randrange(self._models)),
+            }
+            if rnd.random() < 0.5:
+                state = rnd.randrange(len(self.states))
+                search['state'] = 'State {}'.format(state)
+                search['city'] = 'City {}-{}'.format(
+                    state, rnd.randrange(self._cities))
+            if rnd.random() < 0.3:
+                search['fuels'] = [rnd.choice(self.fuels)['name']]
+            searches.append(search)
+        return searches
+
+
+class FakeRiaRequestHandler(JsonRequestHandler):
+    """Handle requests to ''FakeRiaServer''."""
+
+    routes = [
+        (re.compile(r'^/categories$'),
+         lambda c: c.categories),
+        (re.compile(r'^/categories/(\d+)/bodystyles$'),
+         lambda c, category: c.bodystyles),
+        (re.compile(r'^/categories/(\d+)/marks$'),
+         lambda c, category: c.marks(int(category))),
+        (re.compile(r'^/categories/(\d+)/marks/(\d+)/models$'),
+         lambda c, category, mark: c.models(int(category), int(mark))),
+        (re.compile(r'^/categories/(\d+)/gearboxes$'),
+         lambda c, category: c.gearboxes),
+        (re.compile(r'^/categories/(\d+)/driverTypes$'),
+         lambda c, category: c.driver_types),
+        (re.compile(r'^/categories/(\d+)/options$'),
+         lambda c, category: c.options),
+        (re.compile(r'^/states$'),
+         lambda c: c.states),
+        (re.compile(r'^/states/(\d+)/cities$'),
+         lambda c, state: c.cities(int(state))),
+        (re.compile(r'^/fuels$'),
+         lambda c: c.fuels),
+        (re.compile(r'^/colors$'),
+         lambda c: c.colors),
+    ]  # type: List[Tuple[Pattern, Callable[..., Any]]]
+
+    def do_GET(self) -> None:
+        """Respond with generated data, errors or throttling."""
+        server = cast('FakeRiaServer', self.server)
+        url = urlparse(self.path)
+        parameters = parse_qs(url.query)
+        delay, fate = server.roll()
+        if delay:
+            time.sleep(delay)
+        remaining = server.spend_quota(parameters.get('api_key', [''])[0])
+        if fate == 'throttle' or remaining is not None and remaining < 0:
+            # Remaining quota is reported as it is, a throttled key
+            # still has its quota, the exceeded one is reported as 0
+            self._respond(429, {'error': 'Too many requests'}, remaining)
+            return
+        if fate == 'error':
+            self._respond(500, {'error': 'Internal server error'}, remaining)
+            return
+        if url.path == '/average':
+            self._respond(200, server.catalog.average(parameters), remaining)
+            return
+        for pattern, handler in self.routes:
+            match = pattern.match(url.path)
+            if match:
+                self._respond(200, handler(server.catalog, *match.groups()),
+                              remaining)
+                return
+        self._respond(404, {'error': 'Not found'}, remaining)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Do not log requests, there are too many of them."""
+
+    def _respond(self, status: int, data: Any, remaining: int) -> None:
+        self._send_json(status, data, None if remaining is None else {
+            'X-RateLimit-Remaining': str(max(remaining, 0))})
+
+
+class FakeRiaServer(ThreadingJsonServer):
+    """Synthetic auto.ria.com API server, see module docstring."""
+
+    def __init__(self, address: Tuple[str, int] = ('127.0.0.1', 0),
+                 catalog: FakeCatalog = None,
+                 latency: LatencyFunction = None, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, quota: int = None,
+                 seed: int = 0) -> None:
+        """Constructor.
+
+        Args:
+            address - (host, port) pair to listen on, port 0 picks
+                a free one
+            catalog - data to serve, default ''FakeCatalog'' if not given
+            latency - function returning response delay in seconds,
+                see ''constant_latency'' and ''lognormal_latency''
+            error_rate - share of requests failing with HTTP 500
+            throttle_rate - share of requests throttled with HTTP 429
+            quota - number of requests allowed per API key, unlimited
+                if not given
+            seed - random generator seed for latency and failures
+        """
+        self.catalog = catalog if catalog is not None else FakeCatalog()
+        self._latency = latency
+        self._error_rate = error_rate
+        self._throttle_rate = throttle_rate
+        self._quota = quota
+        self._spent = {}  # type: Dict[str, int]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        super().__init__(address, FakeRiaRequestHandler)
+
+    def roll(self) -> Tuple[float, str]:
+        """Pick delay and outcome of the next response.
+
+        Returns:
+            Delay in seconds and one of ''ok'', ''error'', ''throttle''.
+        """
+        with self._lock:
+            delay = self._latency(self._random) if self._latency else 0.0
+            dice = self._random.random()
+        if dice < self._throttle_rate:
+            return delay, 'throttle'
+        if dice < self._throttle_rate + self._error_rate:
+            return delay, 'error'
+        return delay, 'ok'
+
+    def spend_quota(self, api_key: str) -> Any:
+        """Count the request against the key quota.
+
+        Returns:
+            Remaining quota, negative if exceeded, or ''None'' if
+            quota is unlimited.
+        """
+        if self._quota is None:
+            return None
+        with self._lock:
+            self._spent[api_key] = self._spent.get(api_key, 0) + 1
+            return self._quota - self._spent[api_key]
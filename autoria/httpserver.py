@@ -0,0 +1,44 @@
+"""Base classes of local HTTP servers speaking JSON.
+
+Both the warm average price server (''autoria.server'') and the
+synthetic API server (''autoria.fake'') are built on them.
+"""
+
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Dict
+
+
+class JsonRequestHandler(BaseHTTPRequestHandler):
+    """Request handler responding with JSON."""
+
+    def _send_json(self, status: int, data: Any,
+                   headers: Dict[str, str] = None) -> None:
+        """Send the response with data serialized into JSON body.
+
+        Args:
+            status - HTTP status code
+            data - JSON-serializable response data
+            headers - additional response headers
+        """
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ThreadingJsonServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling every request in its own thread."""
+
+    daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        """Base url the server is reachable at."""
+        host, port = self.socket.getsockname()[:2]
+        return 'http://{}:{}'.format(host, port)
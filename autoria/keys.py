@@ -0,0 +1,159 @@
+"""Pool of auto.ria.com API keys.
+
+Every API key has its own request quota, ''ApiKeyPool'' spreads
+requests across several keys, keeping track of remaining quota and
+error rate of every key and avoiding keys which are exhausted or
+throttled. Pass the pool to ''RiaAPI'' and it will set ''api_key''
+of every request itself.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable
+
+
+class QuotaExceeded(Exception):
+    """Request can't be made until API quota or throttling recovers."""
+
+
+class ApiKeyStats:
+    """Usage statistics of a single API key."""
+
+    def __init__(self, quota: int = None) -> None:
+        """Constructor.
+
+        Args:
+            quota - known number of requests allowed for the key,
+                ''None'' if unknown
+        """
+        self.remaining = quota
+        self.requests = 0
+        self.in_flight = 0
+        self.error_rate = 0.0
+        self.throttled_until = 0.0
+
+    def as_dict(self) -> dict:
+        """Statistics as a dictionary."""
+        return {
+            'remaining': self.remaining,
+            'requests': self.requests,
+            'in_flight': self.in_flight,
+            'error_rate': self.error_rate,
+            'throttled_until': self.throttled_until,
+        }
+
+
+class ApiKeyPool:
+    """Select API keys for requests according to their remaining quota.
+
+    A key is picked by the largest remaining quota weighted with its
+    success rate, ties are broken by the success rate and then by the
+    least number of requests, so keys with unknown quota are used in
+    turn. Keys with no quota left are skipped for ''quota_period''
+    seconds, after that their quota is assumed to be restored.
+    Throttled keys (HTTP 429) are skipped for ''cooldown'' seconds.
+    """
+
+    def __init__(self, keys: Iterable[str], quota: int = None,
+                 cooldown: float = 60.0, quota_period: float = 3600.0,
+                 error_decay: float = 0.1,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """Constructor.
+
+        Args:
+            keys - API keys to use
+            quota - initial number of requests allowed per key,
+                ''None'' if unknown, it's updated from responses anyway
+            cooldown - seconds to skip a key after it was throttled
+            quota_period - seconds to skip a key after its quota has
+                run out, then the key gets ''quota'' again
+            error_decay - weight of the latest response in error rate,
+                error rate is an exponential moving average
+            clock - function returning current time in seconds
+        """
+        self._keys = list(keys)
+        if not self._keys:
+            raise Exception('At least one API key is needed')
+        self._stats = {
+            key: ApiKeyStats(quota) for key in self._keys
+        }  # type: Dict[str, ApiKeyStats]
+        self._quota = quota
+        self._cooldown = cooldown
+        self._quota_period = quota_period
+        self._error_decay = error_decay
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of keys in the pool."""
+        return len(self._keys)
+
+    def acquire(self) -> str:
+        """Pick a key for the next request.
+
+        Every acquired key must be passed back to ''report'' once
+        the response is received.
+
+        Returns:
+            API key.
+        """
+        with self._lock:
+            now = self._clock()
+            best = None
+            best_rank = None
+            for key in self._keys:
+                stats = self._stats[key]
+                if stats.throttled_until > now:
+                    continue
+                if stats.remaining is not None and stats.remaining <= 0:
+                    # Quota period has passed, the quota is restored
+                    stats.remaining = self._quota
+                if stats.remaining is not None and \
+                        stats.remaining - stats.in_flight <= 0:
+                    continue
+                if stats.remaining is None:
+                    capacity = float('inf')
+                else:
+                    capacity = stats.remaining - stats.in_flight
+                success = 1.0 - stats.error_rate
+                rank = (capacity * success if success else 0.0, success,
+                        -(stats.requests + stats.in_flight))
+                if best_rank is None or rank > best_rank:
+                    best, best_rank = key, rank
+            if best is None:
+                raise QuotaExceeded(
+                    'All API keys are exhausted or throttled')
+            self._stats[best].in_flight += 1
+            return best
+
+    def report(self, key: str, status_code: int,
+               remaining: int = None) -> None:
+        """Update key statistics with the response received.
+
+        Args:
+            key - API key returned by ''acquire''
+            status_code - HTTP status code of the response
+            remaining - remaining quota reported by the API, if any
+        """
+        with self._lock:
+            stats = self._stats[key]
+            stats.in_flight = max(stats.in_flight - 1, 0)
+            stats.requests += 1
+            failed = status_code == 429 or status_code >= 500
+            stats.error_rate += self._error_decay * (
+                (1.0 if failed else 0.0) - stats.error_rate)
+            if status_code == 429:
+                stats.throttled_until = self._clock() + self._cooldown
+            if remaining is not None:
+                stats.remaining = remaining
+            elif stats.remaining is not None and status_code != 429:
+                stats.remaining = max(stats.remaining - 1, 0)
+            if stats.remaining == 0:
+                stats.throttled_until = max(
+                    stats.throttled_until,
+                    self._clock() + self._quota_period)
+
+    def stats(self) -> Dict[str, dict]:
+        """Statistics of every key, see ''ApiKeyStats.as_dict''."""
+        with self._lock:
+            return {key: self._stats[key].as_dict() for key in self._keys}
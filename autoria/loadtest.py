@@ -0,0 +1,101 @@
+"""Load testing of average price searches.
+
+Runs a list of searches with the given concurrency against any API
+(usually ''FakeRiaServer'') and reports throughput and latency
+percentiles:
+
+    catalog = FakeCatalog()
+    server = FakeRiaServer(catalog=catalog)
+    ...
+    report = run_load_test(CachingRiaAPI(server.url),
+                           catalog.searches(1000), concurrency=8)
+    print(report.summary())
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Tuple
+
+from autoria.api import RiaAPI, RiaAverageCarPrice
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Calculate percentile of sorted values with linear interpolation.
+
+    Args:
+        values - sorted list of values
+        q - percentile, from 0 to 100
+    """
+    if not values:
+        return float('nan')
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+class LoadTestReport(namedtuple('LoadTestReport', [
+        'searches', 'errors', 'duration', 'latencies'])):
+    """Results of a load test.
+
+    Attributes:
+        searches - number of searches made
+        errors - number of failed searches
+        duration - total test duration in seconds
+        latencies - sorted list of search durations in seconds
+    """
+
+    @property
+    def throughput(self) -> float:
+        """Searches per second."""
+        return self.searches / self.duration if self.duration else 0.0
+
+    @property
+    def percentiles(self) -> dict:
+        """Search latency percentiles in seconds."""
+        return {q: percentile(self.latencies, q) for q in PERCENTILES}
+
+    def summary(self) -> str:
+        """Human-readable report."""
+        return '{} searches, {} errors in {:.2f}s, {:.1f} searches/s, ' \
+            'latency {}'.format(
+                self.searches, self.errors, self.duration, self.throughput,
+                ', '.join('p{}={:.1f}ms'.format(q, value * 1000)
+                          for q, value in sorted(self.percentiles.items())))
+
+
+def run_load_test(api: RiaAPI, searches: Iterable[dict],
+                  concurrency: int = 1) -> LoadTestReport:
+    """Run searches and measure their latency.
+
+    Args:
+        api - RiaAPI instance shared by all searches, its configuration
+            (caching, key pool, url) is what's being tested
+        searches - ''RiaAverageCarPrice'' arguments
+        concurrency - number of searches run simultaneously
+
+    Returns:
+        LoadTestReport with the results.
+    """
+    def search(params: dict) -> Tuple[float, bool]:
+        start = time.perf_counter()
+        try:
+            RiaAverageCarPrice(api=api, **params).get_average()
+        except Exception:
+            return time.perf_counter() - start, False
+        return time.perf_counter() - start, True
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(search, searches))
+    duration = time.perf_counter() - start
+    return LoadTestReport(
+        searches=len(results),
+        errors=sum(1 for _, ok in results if not ok),
+        duration=duration,
+        latencies=sorted(latency for latency, _ in results),
+    )
@@ -0,0 +1,265 @@
+"""Resolution of human-readable search parameters into identifiers.
+
+''RiaAverageCarPrice'' needs identifiers of category, mark, model etc.,
+each of them is selected from a list fetched from the API, and some
+lists depend on other identifiers (models depend on category and
+mark). ''ResolutionPlan'' turns search parameters into a graph of such
+lookups, skipping parameters given as identifiers and lists already
+cached by ''CachingRiaAPI'', and runs the remaining requests as
+parallel as dependencies allow:
+
+    plan = ResolutionPlan(api, category='Легковые', mark='Renault',
+                          model='Scenic', state='Харьковская')
+    print(plan.explain())
+    identifiers = plan.execute()
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from autoria.selection import select_item, select_list
+
+if TYPE_CHECKING:
+    # autoria.api uses the planner, so it's imported for annotations only
+    from autoria.api import RiaAPI  # noqa: F401
+
+
+class ResolutionStep:
+    """Lookup of a single search parameter."""
+
+    def __init__(self, name: str, param: str, url: str,
+                 depends_on: tuple, method: str,
+                 multiple: bool = False) -> None:
+        """Constructor.
+
+        Args:
+            name - search parameter name, like in ''RiaAverageCarPrice''
+            param - name of the resolved identifier in
+                ''RiaAverageCarPriceParams''
+            url - API url template, with identifiers of dependencies
+                as placeholders, e.g. ''/categories/{category}/marks''
+            depends_on - names of parameters needed to fetch the list
+            method - name of ''RiaAPI'' method fetching the list,
+                it takes identifiers of dependencies as arguments
+            multiple - the parameter is a list of names
+        """
+        self.name = name
+        self.param = param
+        self.url = url
+        self.depends_on = depends_on
+        self.method = method
+        self.multiple = multiple
+
+    def fetch(self, api: 'RiaAPI', ids: Dict[str, Any]) -> list:
+        """Fetch the list to select from."""
+        return getattr(api, self.method)(
+            *[ids[name] for name in self.depends_on])
+
+    def select(self, query: Any, items: list) -> Any:
+        """Select identifier(s) of the query in the fetched list."""
+        if self.multiple:
+            return select_list(query, items)
+        return select_item(query, items)
+
+
+# Steps are in dependency order
+STEPS = [
+    ResolutionStep('category', 'main_category', '/categories', (),
+                   'get_categories'),
+    ResolutionStep('mark', 'marka_id', '/categories/{category}/marks',
+                   ('category',), 'get_marks'),
+    ResolutionStep('model', 'model_id',
+                   '/categories/{category}/marks/{mark}/models',
+                   ('category', 'mark'), 'get_models'),
+    ResolutionStep('bodystyle', 'body_id',
+                   '/categories/{category}/bodystyles',
+                   ('category',), 'get_bodystyles'),
+    ResolutionStep('state', 'state_id', '/states', (), 'get_states'),
+    ResolutionStep('city', 'city_id', '/states/{state}/cities',
+                   ('state',), 'get_cities'),
+    ResolutionStep('gears', 'gear_id', '/categories/{category}/gearboxes',
+                   ('category',), 'get_gearboxes', multiple=True),
+    ResolutionStep('opts', 'options', '/categories/{category}/options',
+                   ('category',), 'get_options', multiple=True),
+    ResolutionStep('fuels', 'fuel_id', '/fuels', (), 'get_fuels',
+                   multiple=True),
+    ResolutionStep('drives', 'drive_id',
+                   '/categories/{category}/driverTypes',
+                   ('category',), 'get_driver_types', multiple=True),
+    ResolutionStep('color', 'color_id', '/colors', (), 'get_colors'),
+]
+
+
+def _is_id(query: Any) -> bool:
+    if isinstance(query, list):
+        return bool(query) and all(_is_id(item) for item in query)
+    return isinstance(query, int) and not isinstance(query, bool)
+
+
+class ResolutionPlan:
+    """Plan of API requests needed to resolve search parameters.
+
+    The plan is made on construction: parameters given as identifiers
+    (ints, or lists of ints) are used as they are, lists cached by
+    ''CachingRiaAPI'' are used right away, everything else is left
+    for ''execute''.
+    """
+
+    def __init__(self, api: 'RiaAPI', category: Any = None, mark: Any = None,
+                 model: Any = None, bodystyle: Any = None,
+                 state: Any = None, city: Any = None, gears: list = None,
+                 opts: list = None, fuels: list = None, drives: list = None,
+                 color: Any = None, **other_params: Any) -> None:
+        """Constructor.
+
+        Args:
+            api - RiaAPI instance to make requests with
+            category, mark, ... - search parameters, names or
+                identifiers, see ''RiaAverageCarPrice'' for details
+            other_params - the rest of ''RiaAverageCarPrice'' arguments,
+                they don't need any lookups and are ignored, so the
+                whole set of search parameters can be passed
+        """
+        queries = {
+            'category': category, 'mark': mark, 'model': model,
+            'bodystyle': bodystyle, 'state': state, 'city': city,
+            'gears': gears, 'opts': opts, 'fuels': fuels,
+            'drives': drives, 'color': color,
+        }
+        self._api = api
+        self._queries = {}  # type: Dict[str, Any]
+        self._ids = {}  # type: Dict[str, Any]
+        self._steps = []  # type: List[ResolutionStep]
+        self.given = []  # type: List[str]
+        self.cached = []  # type: List[str]
+        self.ignored = []  # type: List[str]
+        self.requests_made = 0
+        for step in STEPS:
+            query = queries[step.name]
+            if query is None:
+                continue
+            if step.name == 'city' and state is None:
+                self.ignored.append('city, because state is not given')
+                continue
+            if _is_id(query):
+                self._ids[step.name] = query
+                self.given.append(step.name)
+                continue
+            self._queries[step.name] = query
+            if all(name in self._ids for name in step.depends_on):
+                missing = [name for name in step.depends_on
+                           if self._ids[name] is None]
+                if missing:
+                    # Same as in ''execute'': the list can't be fetched
+                    self._ids[step.name] = None
+                    self.ignored.append('{}, because {} is not found'.format(
+                        step.name, ', '.join(missing)))
+                    continue
+                url = step.url.format(**self._ids)
+                if self._is_cached(url):
+                    self._resolve(step)
+                    self.cached.append(url)
+                    continue
+            self._steps.append(step)
+
+    @property
+    def requests(self) -> int:
+        """Number of API requests left to make."""
+        return len(self._steps)
+
+    @property
+    def critical_path(self) -> List[ResolutionStep]:
+        """The longest chain of dependent requests."""
+        paths = {}  # type: Dict[str, List[ResolutionStep]]
+        for step in self._steps:
+            longest = []  # type: List[ResolutionStep]
+            for name in step.depends_on:
+                if len(paths.get(name, [])) > len(longest):
+                    longest = paths[name]
+            paths[step.name] = longest + [step]
+        return max(paths.values(), key=len) if paths else []
+
+    @property
+    def round_trips(self) -> int:
+        """Number of sequential request rounds needed."""
+        return len(self.critical_path)
+
+    def execute(self, max_workers: int = None) -> Dict[str, Any]:
+        """Make planned requests and select identifiers.
+
+        Every request is started as soon as identifiers it depends on
+        are known. If a dependency can't be found, dependent
+        parameters are left unresolved.
+
+        Args:
+            max_workers - maximum number of simultaneous requests,
+                as many as possible if not given
+
+        Returns:
+            Dictionary with ''RiaAverageCarPriceParams'' field names
+            as keys, e.g. {'main_category': 1, 'marka_id': 9, ...},
+            with ''None'' for parameters not given or not found.
+        """
+        pending = list(self._steps)
+        if pending:
+            with ThreadPoolExecutor(
+                    max_workers=max_workers or len(pending)) as executor:
+                running = {}  # type: Dict[Any, ResolutionStep]
+                while pending or running:
+                    for step in list(pending):
+                        if any(name in self._queries and
+                               name not in self._ids
+                               for name in step.depends_on):
+                            continue
+                        pending.remove(step)
+                        if all(self._ids.get(name) is not None
+                               for name in step.depends_on):
+                            running[executor.submit(
+                                step.fetch, self._api, self._ids)] = step
+                            self.requests_made += 1
+                        else:
+                            self._ids[step.name] = None
+                    if not running:
+                        continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        step = running.pop(future)
+                        self._ids[step.name] = step.select(
+                            self._queries[step.name], future.result())
+            self._steps = []
+        return {step.param: self._ids.get(step.name) for step in STEPS}
+
+    def explain(self) -> str:
+        """Describe planned requests in human-readable form."""
+        lines = ['Resolution plan: {} requests in {} round trips'.format(
+            self.requests, self.round_trips)]
+        if self.given:
+            lines.append('Given as identifiers: {}'.format(
+                ', '.join(self.given)))
+        if self.cached:
+            lines.append('Cached: {}'.format(', '.join(self.cached)))
+        if self.ignored:
+            lines.append('Ignored: {}'.format(', '.join(self.ignored)))
+        for step in self._steps:
+            lines.append('  GET {} -> {}{}'.format(
+                self._describe_url(step), step.name,
+                ' (after {})'.format(', '.join(step.depends_on))
+                if any(name not in self._ids for name in step.depends_on)
+                else ''))
+        if self.round_trips > 1:
+            lines.append('Critical path: {}'.format(' -> '.join(
+                self._describe_url(step) for step in self.critical_path)))
+        return '\n'.join(lines)
+
+    def _describe_url(self, step: ResolutionStep) -> str:
+        known = {name: '{' + name + '}' for name in step.depends_on}
+        known.update(self._ids)
+        return step.url.format(**known)
+
+    def _is_cached(self, url: str) -> bool:
+        is_cached = getattr(self._api, 'is_cached', None)
+        return is_cached is not None and is_cached(url)
+
+    def _resolve(self, step: ResolutionStep) -> None:
+        self._ids[step.name] = step.select(
+            self._queries[step.name], step.fetch(self._api, self._ids))
@@ -0,0 +1,372 @@
+"""Adaptive polling of saved searches.
+
+Average prices of most saved searches hardly change between polls,
+while some of them move all the time. ''PollScheduler'' measures how
+much ''total'', ''arithmeticMean'' and ''classifieds'' of every search
+change between polls and adapts its polling interval: the interval
+is halved when the result moves a lot and doubled when it stays the
+same. Volatile searches are polled first, start times are jittered
+and the total number of polls is limited by a request budget:
+
+    scheduler = PollScheduler(budget=1000, budget_period=3600)
+    scheduler.add('cx-5', search_params)
+    poll = search_poller(CachingRiaAPI())
+    while True:
+        scheduler.run_pending(poll)
+        time.sleep(60)
+"""
+
+import heapq
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple  # noqa: F401
+
+from autoria.api import RiaAPI, RiaAverageCarPrice
+
+
+class SavedSearch:
+    """Polling state of a saved search."""
+
+    def __init__(self, search_id: str, params: dict, interval: float,
+                 next_poll: float, cost: float) -> None:
+        """Constructor.
+
+        Args:
+            search_id - saved search identifier
+            params - ''RiaAverageCarPrice'' arguments
+            interval - current polling interval in seconds
+            next_poll - time of the next poll
+            cost - expected number of requests of a poll
+        """
+        self.search_id = search_id
+        self.params = params
+        self.interval = interval
+        self.next_poll = next_poll
+        self.volatility = 0.0
+        self.last_change = None  # type: Optional[float]
+        self.polls = 0
+        self.cost = cost
+        self._charged = 0.0
+        self._last = None  # type: Optional[dict]
+
+    def charge(self) -> float:
+        """Charge the expected cost of a poll, returns the cost."""
+        self._charged = self.cost
+        return self._charged
+
+    def settle(self, requests: int = None) -> float:
+        """Settle the charge of a poll with the actual cost.
+
+        Args:
+            requests - number of requests the poll made, the expected
+                cost is kept if not given
+
+        Returns:
+            The amount overcharged, negative if the poll cost more.
+        """
+        overcharged = 0.0
+        if requests is not None:
+            overcharged = self._charged - requests
+            self.cost = requests
+        self._charged = 0.0
+        return overcharged
+
+    def observe(self, average: dict) -> Optional[float]:
+        """Remember the polled result.
+
+        Returns:
+            Its change since the previous poll, see ''result_change'',
+            ''None'' for the first poll.
+        """
+        current = {key: average.get(key) for key in (
+            'total', 'arithmeticMean', 'classifieds')}
+        change = None
+        if self._last is not None:
+            change = result_change(self._last, current)
+            self.last_change = change
+        self._last = current
+        self.polls += 1
+        return change
+
+    def as_dict(self) -> dict:
+        """Polling state as a dictionary."""
+        return {
+            'interval': self.interval,
+            'next_poll': self.next_poll,
+            'volatility': self.volatility,
+            'last_change': self.last_change,
+            'polls': self.polls,
+            'cost': self.cost,
+        }
+
+
+def _relative_change(old: float, new: float) -> float:
+    if old == new:
+        return 0.0
+    return abs(new - old) / max(abs(old), abs(new))
+
+
+def result_change(old: dict, new: dict) -> float:
+    """Measure how much average price result has changed.
+
+    Returns:
+        The largest of relative changes of ''total'' and
+        ''arithmeticMean'' and the share of ''classifieds'' which
+        appeared or disappeared, from 0 (same) to 1.
+    """
+    old_classifieds = set(old.get('classifieds') or [])
+    new_classifieds = set(new.get('classifieds') or [])
+    union = old_classifieds | new_classifieds
+    return max(
+        _relative_change(old.get('total') or 0, new.get('total') or 0),
+        _relative_change(old.get('arithmeticMean') or 0,
+                         new.get('arithmeticMean') or 0),
+        len(old_classifieds ^ new_classifieds) / len(union) if union else 0,
+    )
+
+
+class PollScheduler:
+    """Schedule polls of saved searches according to their volatility.
+
+    A poll is charged the number of requests it made: search lookups
+    and the average price request. Until a poll is made, its cost is
+    estimated by the previous poll of the search. The budget is
+    refilled continuously at ''budget / budget_period'' requests per
+    second.
+    """
+
+    def __init__(self, min_interval: float = 900.0,
+                 max_interval: float = 86400.0,
+                 initial_interval: float = 3600.0,
+                 budget: float = 1000.0, budget_period: float = 3600.0,
+                 stable_change: float = 0.01, volatile_change: float = 0.1,
+                 volatility_decay: float = 0.3, jitter: float = 0.1,
+                 initial_cost: float = 4.0,
+                 clock: Callable[[], float] = time.time,
+                 seed: int = None) -> None:
+        """Constructor.
+
+        Args:
+            min_interval - the shortest polling interval, seconds
+            max_interval - the longest polling interval, seconds
+            initial_interval - polling interval of new searches
+            budget - maximum number of requests per budget period,
+                also the largest burst of requests
+            budget_period - budget period in seconds
+            stable_change - change below it doubles the interval,
+                see ''result_change''
+            volatile_change - change above it halves the interval
+            volatility_decay - weight of the latest change in
+                volatility, it's an exponential moving average
+            jitter - maximum random deviation of intervals, a share
+                of the interval
+            initial_cost - expected number of requests of the first
+                poll, lookups of category, mark and model and the
+                average price request if nothing is cached
+            clock - function returning current time in seconds
+            seed - random generator seed
+        """
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._initial_interval = initial_interval
+        self._budget = budget
+        self._refill_rate = budget / budget_period
+        self._stable_change = stable_change
+        self._volatile_change = volatile_change
+        self._volatility_decay = volatility_decay
+        self._jitter = jitter
+        self._initial_cost = initial_cost
+        self._clock = clock
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._searches = {}  # type: Dict[str, SavedSearch]
+        self._queue = []  # type: List[Tuple[float, str]]
+        self._tokens = budget
+        self._refilled_at = clock()
+
+    def __len__(self) -> int:
+        """Number of saved searches."""
+        return len(self._searches)
+
+    def add(self, search_id: str, params: dict) -> None:
+        """Add a saved search.
+
+        Its first poll is at random time within the initial interval,
+        so that searches added together are not polled together.
+
+        Args:
+            search_id - saved search identifier
+            params - ''RiaAverageCarPrice'' arguments
+        """
+        with self._lock:
+            search = SavedSearch(
+                search_id, params, self._initial_interval,
+                self._clock() + self._random.uniform(
+                    0, self._initial_interval), self._initial_cost)
+            self._searches[search_id] = search
+            heapq.heappush(self._queue, (search.next_poll, search_id))
+
+    def remove(self, search_id: str) -> None:
+        """Remove a saved search."""
+        with self._lock:
+            self._searches.pop(search_id, None)
+
+    def stats(self, search_id: str) -> dict:
+        """Polling state of the search, see ''SavedSearch.as_dict''."""
+        with self._lock:
+            return self._searches[search_id].as_dict()
+
+    def next_poll(self) -> Optional[float]:
+        """Time of the earliest scheduled poll, ''None'' if no searches."""
+        with self._lock:
+            self._drop_stale()
+            return self._queue[0][0] if self._queue else None
+
+    def due(self) -> List[Tuple[str, dict]]:
+        """Take searches to poll now.
+
+        Searches which are due are ordered by volatility, the most
+        volatile first, and taken as long as there is budget left for
+        their expected cost. The rest stays due until the budget is
+        refilled.
+
+        Returns:
+            The list of (search_id, params) pairs.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self._budget,
+                self._tokens + (now - self._refilled_at) * self._refill_rate)
+            self._refilled_at = now
+            due = []
+            due_ids = set()  # type: Set[str]
+            while True:
+                self._drop_stale()
+                if not self._queue or self._queue[0][0] > now:
+                    break
+                search_id = heapq.heappop(self._queue)[1]
+                # A search may have the same entry pushed twice, when it
+                # is rescheduled to the time it was protected until
+                if search_id not in due_ids:
+                    due_ids.add(search_id)
+                    due.append(self._searches[search_id])
+            due.sort(key=lambda search: (-search.volatility,
+                                         search.next_poll))
+            taken = []
+            for search in due:
+                if self._tokens >= min(search.cost, self._budget):
+                    self._tokens -= search.charge()
+                    # Polled searches are rescheduled by ''record'', this
+                    # one protects from polling them again meanwhile
+                    search.next_poll = now + search.interval
+                    taken.append((search.search_id, search.params))
+                heapq.heappush(self._queue, (search.next_poll,
+                                             search.search_id))
+            return taken
+
+    def record(self, search_id: str, average: dict,
+               requests: int = None) -> None:
+        """Reschedule the search according to the polled result.
+
+        Args:
+            search_id - saved search identifier
+            average - average price result of the poll
+            requests - number of requests the poll made, the budget
+                is corrected by it, the expected cost is kept if
+                not given
+        """
+        with self._lock:
+            search = self._searches.get(search_id)
+            if search is None:
+                return
+            self._settle(search, requests)
+            change = search.observe(average)
+            if change is not None:
+                search.volatility += self._volatility_decay * (
+                    change - search.volatility)
+                if change < self._stable_change:
+                    search.interval *= 2
+                elif change > self._volatile_change:
+                    search.interval /= 2
+                search.interval = min(max(
+                    search.interval, self._min_interval), self._max_interval)
+            self._schedule(search)
+
+    def record_failure(self, search_id: str, requests: int = None) -> None:
+        """Retry the search after the shortest interval.
+
+        Args:
+            search_id - saved search identifier
+            requests - number of requests the poll made, see ''record''
+        """
+        with self._lock:
+            search = self._searches.get(search_id)
+            if search is not None:
+                self._settle(search, requests)
+                search.next_poll = self._clock() + self._min_interval
+                heapq.heappush(self._queue, (search.next_poll, search_id))
+
+    def run_pending(self,
+                    poll: Callable[[dict], Tuple[dict, int]]) -> int:
+        """Poll all due searches the budget allows.
+
+        Args:
+            poll - function taking search parameters and returning
+                average price result and the number of requests made,
+                see ''search_poller''
+
+        Returns:
+            Number of polls made.
+        """
+        polls = 0
+        for search_id, params in self.due():
+            try:
+                average, requests = poll(params)
+            except Exception:
+                self.record_failure(search_id)
+            else:
+                self.record(search_id, average, requests)
+            polls += 1
+        return polls
+
+    def _settle(self, search: SavedSearch, requests: int = None) -> None:
+        # Tokens may go below zero, then nothing is polled until the
+        # budget is refilled
+        self._tokens += search.settle(requests)
+
+    def _schedule(self, search: SavedSearch) -> None:
+        search.next_poll = self._clock() + search.interval * (
+            1 + self._random.uniform(-self._jitter, self._jitter))
+        heapq.heappush(self._queue, (search.next_poll, search.search_id))
+
+    def _drop_stale(self) -> None:
+        # Rescheduled and removed searches leave their old entries in
+        # the queue, they are dropped once they get to the top
+        while self._queue:
+            next_poll, search_id = self._queue[0]
+            search = self._searches.get(search_id)
+            if search is not None and search.next_poll == next_poll:
+                return
+            heapq.heappop(self._queue)
+
+
+def search_poller(api: RiaAPI = None) -> Callable[[dict], Tuple[dict, int]]:
+    """Make a poll function for ''PollScheduler.run_pending''.
+
+    Args:
+        api - RiaAPI instance to make requests with, pass
+            ''CachingRiaAPI'' to save lookups
+
+    Returns:
+        Function taking ''RiaAverageCarPrice'' arguments and returning
+        average price result and the number of requests made.
+    """
+    api = api if api is not None else RiaAPI()
+
+    def poll(params: dict) -> Tuple[dict, int]:
+        search = RiaAverageCarPrice(api=api, **params)
+        return search.get_average(), search.plan.requests_made + 1
+
+    return poll
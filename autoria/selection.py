@@ -0,0 +1,212 @@
+"""Selection of identifiers in auto.ria.com lists.
+
+Functions converting human-readable names, like ''Винница'', into
+identifiers understood by the API, using lists returned by ''get_''
+methods of RiaAPI.
+"""
+
+import unicodedata
+from bisect import bisect_left, bisect_right
+from fnmatch import fnmatch
+from typing import Any, Dict, Iterable, List, Optional  # noqa: F401
+
+
+def select_item(item_to_select: str, items_list: list) -> int:
+    """Select vehicle type, bodystyle, mark, model from the given list.
+
+    This function is intended to convert human-readable search
+    parameter, for instance, ''Винница'' into API-understandable
+    state identifier, for the given example it would be 1.
+
+    Args:
+        item_to_select - could be not 100% accurate as it is in the
+            auto.ria.ua lists, e.g. value ''Харьков'' is acceptable,
+            because the parameter is wild-carded in comprasion like
+            ''*Харьков*'', the function will find suitable name
+            ''Харьковская'' and will return its id.
+        items_list - JSON-formatted list of pairs ''name: value'',
+                obtained from one of the ''get_'' functions.
+
+    Returns:
+        needed item (category, bodystyle, mark etc.) identifyer.
+    """
+    if item_to_select is not None and items_list is not None:
+        for item in items_list:
+            if fnmatch(item['name'], item_to_select):
+                return item['value']
+        for item in items_list:
+            if fnmatch(item['name'], '{}*'.format(item_to_select)):
+                return item['value']
+        for item in items_list:
+            if fnmatch(item['name'], '*{}*'.format(item_to_select)):
+                return item['value']
+
+
+def select_list(list_to_select: list, items_list: list) -> list:
+    """Select a list of ids in the list of dictionaries.
+
+    The function is intended to select a list of options inside
+    the list of dictionaries returned by any ''get_'' method of
+    RiaAPI.
+    For example, we have:
+        gears=['Ручная / Механика', 'Автомат']
+    as a search parameter, we need to:
+    1. Get a list of dictionaries (happens not in this function)
+    2. Define ids of provided options (happens right here)
+
+    Args:
+        list_to_select - a list of options to select, for instance,
+                ['Ручная / Механика', 'Автомат']
+        items_list - list of dictionaries with option names and ids,
+        for example:
+            [
+                {
+                name: "Ручная / Механика",
+                value: 1
+                },
+                ...
+            ]
+
+    Returns:
+        The list of ids, ready-to-use in other methods, for example:
+            [1, 2]
+    """
+    if list_to_select is not None:
+        selected_list = []
+        for item in list_to_select:
+            selected_item = select_item(item, items_list)
+            selected_list.append(selected_item)
+        return selected_list
+
+
+# Separates names joined into a single string in ''select_many''
+_NAMES_SEPARATOR = '\x00'
+# Length of name fragments indexed by ''_NameIndex'' for substring search
+_NGRAM = 3
+# Greater than any character, ends the range of names with a prefix
+_LAST_CHARACTER = '\U0010ffff'
+
+
+def _normalize(name: str) -> str:
+    return unicodedata.normalize('NFC', name.strip())
+
+
+class _NameIndex:
+    """Index of names for exact, prefix and substring lookups.
+
+    Every lookup returns position of the first matching name in the
+    original list, the same one ''select_item'' would find.
+    """
+
+    def __init__(self, names: List[str]) -> None:
+        self._names = names
+        order = sorted(range(len(names)), key=lambda i: (names[i], i))
+        self._sorted = [names[i] for i in order]
+        # Sparse table of minimal positions in ranges of sorted names:
+        # ''self._first[k][i]'' is the minimum of order[i:i + 2 ** k]
+        self._first = [order]
+        while 2 ** len(self._first) <= len(order):
+            previous, step = self._first[-1], 2 ** (len(self._first) - 1)
+            self._first.append([
+                min(previous[i], previous[i + step])
+                for i in range(len(previous) - step)])
+        self._ngrams = {}  # type: Dict[str, List[int]]
+        for position, name in enumerate(names):
+            for ngram in {name[i:i + _NGRAM]
+                          for i in range(len(name) - _NGRAM + 1)}:
+                self._ngrams.setdefault(ngram, []).append(position)
+        self._joined = _NAMES_SEPARATOR + _NAMES_SEPARATOR.join(names)
+        self._starts = []  # type: List[int]
+        start = 1
+        for name in names:
+            self._starts.append(start)
+            start += len(name) + 1
+
+    def exact(self, item: str) -> Optional[int]:
+        """Position of the name equal to the item."""
+        low = bisect_left(self._sorted, item)
+        if low < len(self._sorted) and self._sorted[low] == item:
+            return self._first[0][low]
+        return None
+
+    def prefix(self, item: str) -> Optional[int]:
+        """Position of the first name starting with the item."""
+        low = bisect_left(self._sorted, item)
+        high = bisect_left(self._sorted, item + _LAST_CHARACTER, low)
+        if low == high:
+            return None
+        level = (high - low).bit_length() - 1
+        return min(self._first[level][low],
+                   self._first[level][high - 2 ** level])
+
+    def substring(self, item: str) -> Optional[int]:
+        """Position of the first name containing the item."""
+        if len(item) < _NGRAM:
+            # Too short to be indexed, all names are scanned at once
+            found = self._joined.find(item)
+            if found < 0:
+                return None
+            return bisect_right(self._starts, found) - 1
+        candidates = None  # type: Optional[List[int]]
+        for i in range(len(item) - _NGRAM + 1):
+            positions = self._ngrams.get(item[i:i + _NGRAM])
+            if positions is None:
+                return None
+            if candidates is None or len(positions) < len(candidates):
+                candidates = positions
+        for position in candidates or []:
+            if item in self._names[position]:
+                return position
+        return None
+
+
+def select_many(items_to_select: Iterable[str], items_list: list,
+                missing: Any = None) -> list:
+    """Select ids of many items in the list of dictionaries at once.
+
+    Does the same as ''select_item'' for every item: exact match is
+    preferred to a name starting with the item, which is preferred to
+    a name containing the item. Items are stripped of surrounding
+    whitespace and Unicode-normalized (names too), duplicates are
+    resolved only once. Names are indexed, so that an item is looked
+    up without going through all of them, it takes a fraction of time
+    needed for calling ''select_item'' for every item, e.g. to resolve
+    a column of free-text mark names from a database.
+
+    Args:
+        items_to_select - names to select, e.g.
+                ['Renault', 'Mazda', 'Renault', ...]
+        items_list - list of dictionaries with names and ids,
+                obtained from one of the ''get_'' functions
+        missing - value returned for items which are not found,
+                empty or ''None''
+
+    Returns:
+        The list of ids in the order of given items, for example:
+            [1, 5, 1, ...]
+    """
+    normalized = [None if item is None else _normalize(item)
+                  for item in items_to_select]
+    if not items_list:
+        return [missing] * len(normalized)
+    names = [unicodedata.normalize('NFC', item['name'])
+             for item in items_list]
+    index = _NameIndex(names)
+
+    def resolve(item: Optional[str]) -> Any:
+        if not item:
+            return missing
+        if _NAMES_SEPARATOR in item or any(c in item for c in '*?['):
+            # Wildcards are matched the same way as in ''select_item''
+            selected = select_item(item, [
+                {'name': name, 'value': original['value']}
+                for name, original in zip(names, items_list)])
+            return missing if selected is None else selected
+        for lookup in (index.exact, index.prefix, index.substring):
+            position = lookup(item)
+            if position is not None:
+                return items_list[position]['value']
+        return missing
+
+    resolved = {item: resolve(item) for item in set(normalized)}
+    return [resolved[item] for item in normalized]
@@ -0,0 +1,188 @@
+"""Warm auto.ria.com average price server.
+
+A long-living process keeping ''CachingRiaAPI'' (its connection pool
+and all fetched reference data) in memory, so that each search only
+costs the average price request itself. Searches are accepted over
+local HTTP, ''RiaClient'' is a small client for it.
+
+Endpoints:
+    GET /health - returns {"status": "ok"}
+    POST /average - accepts JSON object with ''RiaAverageCarPrice''
+        arguments and returns the average price data
+    POST /refresh - forgets cached reference data, so that new marks,
+        models etc. are fetched by the following searches
+"""
+
+import inspect
+import json
+from typing import Any, List, Tuple, cast
+
+import requests
+
+from autoria.api import (API_URL, REQUIRED_SEARCH_PARAMS, CachingRiaAPI,
+                         RiaAPI, RiaAverageCarPrice)
+from autoria.httpserver import JsonRequestHandler, ThreadingJsonServer
+from autoria.keys import ApiKeyPool
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Arguments of ''RiaAverageCarPrice'' accepted from clients, all of
+# them are passed by name, so required ones may follow optional ones
+SEARCH_SIGNATURE = inspect.signature(RiaAverageCarPrice).replace(
+    parameters=[
+        parameter.replace(
+            kind=inspect.Parameter.KEYWORD_ONLY,
+            default=inspect.Parameter.empty
+            if parameter.name in REQUIRED_SEARCH_PARAMS
+            else parameter.default)
+        for parameter
+        in inspect.signature(RiaAverageCarPrice).parameters.values()
+        if parameter.name != 'api'
+    ])
+
+
+class RiaRequestHandler(JsonRequestHandler):
+    """Handle requests to ''RiaServer''."""
+
+    def do_GET(self) -> None:
+        """Respond to health checks."""
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'Not found: {}'.format(self.path)})
+
+    def do_POST(self) -> None:
+        """Calculate average price or refresh reference data."""
+        server = cast('RiaServer', self.server)
+        if self.path == '/refresh':
+            clear_cache = getattr(server.api, 'clear_cache', None)
+            if clear_cache is not None:
+                clear_cache()
+            self._send_json(200, {'status': 'ok'})
+            return
+        if self.path != '/average':
+            self._send_json(404, {'error': 'Not found: {}'.format(self.path)})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            search_params = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(search_params, dict):
+                raise ValueError('Search parameters must be a JSON object')
+            SEARCH_SIGNATURE.bind(**search_params)
+            if search_params.get('api_key') is None and \
+                    server.api.key_pool is None:
+                raise ValueError('api_key is required')
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        try:
+            average = RiaAverageCarPrice(
+                api=server.api, **search_params).get_average()
+        except Exception as e:
+            self._send_json(502, {'error': str(e)})
+            return
+        self._send_json(200, average)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Log requests only if the server is verbose."""
+        if cast('RiaServer', self.server).verbose:
+            super().log_message(format, *args)
+
+
+class RiaServer(ThreadingJsonServer):
+    """HTTP server answering average price searches.
+
+    Every request is handled in its own thread, all of them share
+    the same ''api'' instance.
+    """
+
+    def __init__(self, address: Tuple[str, int] = (DEFAULT_HOST, DEFAULT_PORT),
+                 api: RiaAPI = None, verbose: bool = False) -> None:
+        """Constructor.
+
+        Args:
+            address - (host, port) pair to listen on, port 0 picks
+                a free one
+            api - RiaAPI instance to make requests with,
+                ''CachingRiaAPI'' is created if not given
+            verbose - log every handled request to stderr
+        """
+        self.api = api if api is not None else CachingRiaAPI()
+        self.verbose = verbose
+        super().__init__(address, RiaRequestHandler)
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+          api_url: str = None, api_keys: List[str] = None,
+          cache_ttl: float = None, warm: bool = True,
+          verbose: bool = False) -> None:
+    """Run ''RiaServer'' until interrupted.
+
+    Args:
+        host - interface to listen on
+        port - port to listen on
+        api_url - base url of auto.ria.com API, the default one is
+            used if not given
+        api_keys - API keys to spread requests across, if given,
+            ''api_key'' of searches is ignored
+        cache_ttl - seconds to keep reference data for, until
+            ''/refresh'' is requested if not given
+        warm - prefetch reference data before accepting requests
+        verbose - log every handled request to stderr
+    """
+    api = CachingRiaAPI(
+        api_url or API_URL,
+        key_pool=ApiKeyPool(api_keys) if api_keys else None,
+        ttl=cache_ttl)
+    if warm:
+        api.warm()
+    server = RiaServer((host, port), api=api, verbose=verbose)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class RiaClient:
+    """Client for ''RiaServer''."""
+
+    def __init__(self, url: str = 'http://{}:{}'.format(
+            DEFAULT_HOST, DEFAULT_PORT)) -> None:
+        """Constructor.
+
+        Args:
+            url - base url of running ''RiaServer''
+        """
+        self._url = url.rstrip('/')
+        self._session = requests.Session()
+
+    def average(self, **search_params: Any) -> dict:
+        """Get average price, accepts ''RiaAverageCarPrice'' arguments."""
+        response = self._session.post(
+            self._url + '/average', data=json.dumps(search_params),
+            headers={'Content-Type': 'application/json'})
+        if response.status_code == 200:
+            return json.loads(response.text)
+        else:
+            raise Exception(
+                'Error making a request to: {}, response: {}, {}'
+                .format(self._url, response.status_code, response.text))
+
+    def refresh(self) -> None:
+        """Make the server forget cached reference data."""
+        response = self._session.post(self._url + '/refresh')
+        if response.status_code != 200:
+            raise Exception(
+                'Error making a request to: {}, response: {}, {}'
+                .format(self._url, response.status_code, response.text))
+
+    def health(self) -> bool:
+        """Check whether the server is up."""
+        try:
+            response = self._session.get(self._url + '/health')
+        except requests.ConnectionError:
+            return False
+        return response.status_code == 200
@@ -0,0 +1,256 @@
+"""Mergeable price distribution sketches.
+
+Percentiles and interquartile means returned by the average price API
+can't be combined, e.g. there is no way to get the country-wide
+median out of medians of every state. ''PriceSketch'' is a t-digest:
+a compact summary of prices which can be merged with other sketches
+and still gives accurate percentiles and trimmed means, its size is
+bounded by the compression parameter no matter how many prices it
+summarizes.
+
+Sketches are attached to average price results with ''attach_sketch''
+and combined with ''merge_averages'':
+
+    national = merge_averages([kyiv_average, kharkiv_average, ...])
+    national['percentiles']['50.0']
+"""
+
+import math
+from typing import Any, Dict, Iterable, List, Tuple  # noqa: F401
+
+# Percentiles returned by the average price API
+PERCENTILES = (1.0, 5.0, 25.0, 50.0, 75.0, 95.0, 99.0)
+
+
+class PriceSketch:
+    """t-digest of prices.
+
+    Prices are kept as centroids (mean, weight), centroids close to
+    the distribution tails are kept small, so extreme percentiles
+    are the most accurate ones.
+    """
+
+    def __init__(self, compression: float = 100.0) -> None:
+        """Constructor.
+
+        Args:
+            compression - the larger it is, the more accurate and
+                the larger the sketch is, it has at most about
+                ''compression'' centroids
+        """
+        self.compression = compression
+        self._centroids = []  # type: List[Tuple[float, float]]
+        self._buffer = []  # type: List[Tuple[float, float]]
+        self._count = 0.0
+        self._sum = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+
+    def __len__(self) -> int:
+        """Number of centroids in the sketch."""
+        self._compress()
+        return len(self._centroids)
+
+    @property
+    def count(self) -> float:
+        """Number of prices summarized."""
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        """Exact arithmetic mean of prices."""
+        return self._sum / self._count if self._count else math.nan
+
+    def add(self, price: float, weight: float = 1.0) -> None:
+        """Add a price to the sketch."""
+        self._add_centroid(float(price), float(weight))
+        self._sum += price * weight
+
+    def update(self, prices: Iterable[float]) -> None:
+        """Add all prices to the sketch."""
+        for price in prices:
+            self.add(price)
+
+    def merge(self, other: 'PriceSketch') -> None:
+        """Add all prices summarized by another sketch."""
+        other._compress()
+        for mean, weight in other._centroids:
+            self._add_centroid(mean, weight)
+        self._sum += other._sum
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+
+    def quantile(self, q: float) -> float:
+        """Estimate price quantile.
+
+        Args:
+            q - quantile, from 0 to 1, e.g. 0.5 for the median
+        """
+        self._compress()
+        if not self._centroids:
+            return math.nan
+        rank = q * self._count
+        # Every centroid is assumed to be centered at the middle of
+        # its weight, values are interpolated between the centers,
+        # tails are interpolated to the known minimum and maximum
+        previous_rank, previous_mean = 0.0, self._min
+        cumulative = 0.0
+        for mean, weight in self._centroids:
+            center = cumulative + weight / 2
+            if rank < center:
+                return _interpolate(
+                    rank, previous_rank, center, previous_mean, mean)
+            previous_rank, previous_mean = center, mean
+            cumulative += weight
+        return _interpolate(
+            rank, previous_rank, self._count, previous_mean, self._max)
+
+    def trimmed_mean(self, low: float, high: float) -> float:
+        """Estimate mean of prices between two quantiles.
+
+        Args:
+            low - lower quantile, e.g. 0.25
+            high - upper quantile, e.g. 0.75 for interquartile mean
+        """
+        self._compress()
+        low_rank, high_rank = low * self._count, high * self._count
+        total = weights = 0.0
+        cumulative = 0.0
+        for mean, weight in self._centroids:
+            overlap = min(cumulative + weight, high_rank) - max(
+                cumulative, low_rank)
+            if overlap > 0:
+                total += mean * overlap
+                weights += overlap
+            cumulative += weight
+        return total / weights if weights else math.nan
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the sketch into JSON-compatible dictionary."""
+        self._compress()
+        return {
+            'compression': self.compression,
+            'centroids': [[mean, weight] for mean, weight in self._centroids],
+            'sum': self._sum,
+            'min': self._min if self._centroids else None,
+            'max': self._max if self._centroids else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PriceSketch':
+        """Deserialize the sketch produced by ''to_dict''."""
+        sketch = cls(data['compression'])
+        for mean, weight in data['centroids']:
+            sketch._add_centroid(mean, weight)
+        sketch._sum = data['sum']
+        if data['min'] is not None:
+            sketch._min = data['min']
+            sketch._max = data['max']
+        sketch._compress()
+        return sketch
+
+    def _add_centroid(self, mean: float, weight: float) -> None:
+        self._buffer.append((mean, weight))
+        self._count += weight
+        self._min = min(self._min, mean)
+        self._max = max(self._max, mean)
+        if len(self._buffer) > 5 * self.compression:
+            self._compress()
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        centroids = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        merged = []
+        mean, weight = centroids[0]
+        passed = 0.0
+        limit = self._count * self._quantile_limit(0.0)
+        for next_mean, next_weight in centroids[1:]:
+            if passed + weight + next_weight <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append((mean, weight))
+                passed += weight
+                limit = self._count * self._quantile_limit(
+                    passed / self._count)
+                mean, weight = next_mean, next_weight
+        merged.append((mean, weight))
+        self._centroids = merged
+
+    def _quantile_limit(self, q: float) -> float:
+        # The largest quantile a centroid starting at q may reach,
+        # according to t-digest k1 scale function
+        q = min(max(q, 0.0), 1.0)
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+        k += 1
+        return (math.sin(min(
+            k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+
+def _interpolate(x: float, x0: float, x1: float,
+                 y0: float, y1: float) -> float:
+    if x1 <= x0:
+        return y1
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def sketch_from_average(average: dict,
+                        compression: float = 100.0) -> PriceSketch:
+    """Get the sketch of an average price result.
+
+    Args:
+        average - average price result as returned by
+            ''RiaAPI.average_price'', the attached sketch is used
+            if there is one, otherwise it's built from ''prices''
+        compression - compression of the built sketch
+    """
+    if average.get('sketch'):
+        return PriceSketch.from_dict(average['sketch'])
+    sketch = PriceSketch(compression)
+    sketch.update(average.get('prices') or [])
+    return sketch
+
+
+def attach_sketch(average: dict, compression: float = 100.0) -> dict:
+    """Copy of an average price result with serialized sketch attached.
+
+    The sketch is stored under ''sketch'' key, results with sketches
+    attached can be stored and later combined with ''merge_averages''.
+    """
+    result = dict(average)
+    result['sketch'] = sketch_from_average(average, compression).to_dict()
+    return result
+
+
+def merge_averages(averages: Iterable[dict],
+                   compression: float = 100.0) -> dict:
+    """Combine average price results, e.g. of every state.
+
+    Args:
+        averages - average price results, with or without sketches
+        compression - compression of the merged sketch
+
+    Returns:
+        Dictionary in the same format as average price result:
+        ''total'', ''arithmeticMean'', ''interQuartileMean'' and
+        ''percentiles'', with merged ''sketch'' attached. Lists of
+        prices and classifieds are not combined. Means and percentiles
+        are ''None'' if there are no prices at all.
+    """
+    sketch = PriceSketch(compression)
+    for average in averages:
+        sketch.merge(sketch_from_average(average, compression))
+    empty = not sketch.count
+    return {
+        'total': int(sketch.count),
+        'arithmeticMean': None if empty else sketch.mean,
+        'interQuartileMean': None if empty
+        else sketch.trimmed_mean(0.25, 0.75),
+        'percentiles': {
+            str(q): None if empty else sketch.quantile(q / 100)
+            for q in PERCENTILES
+        },
+        'sketch': sketch.to_dict(),
+    }
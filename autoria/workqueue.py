@@ -0,0 +1,330 @@
+"""Distributed work queue for large batches of average price searches.
+
+Searches are put into a shared queue, any number of workers (possibly
+on different machines) lease them, calculate average prices and write
+results into their own shard files, which are merged in the end.
+
+A lease expires after ''lease_timeout'' seconds, so searches leased by
+a dead worker are handed out again. Searches which can't be made
+because of exhausted API quota are returned to the queue and the
+worker waits for the quota to recover. Completing a search is idempotent:
+only the first completion counts, results of repeated ones are dropped
+when shards are merged.
+
+''WorkQueue'' describes the queue interface, ''SqliteWorkQueue'' is its
+implementation on top of a sqlite database file.
+"""
+
+import abc
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from autoria.api import CachingRiaAPI, RiaAPI, RiaAverageCarPrice
+from autoria.keys import QuotaExceeded
+from autoria.sketch import attach_sketch
+
+Lease = namedtuple('Lease', ['task_id', 'params', 'token'])
+
+
+class WorkQueue(abc.ABC):
+    """Interface of a queue of searches.
+
+    Every search (task) has an unique identifier and a dictionary of
+    ''RiaAverageCarPrice'' arguments.
+    """
+
+    @abc.abstractmethod
+    def put(self, tasks: Iterable[Tuple[str, dict]]) -> int:
+        """Add tasks to the queue, already known ids are ignored.
+
+        Args:
+            tasks - iterable of (task_id, params) pairs
+
+        Returns:
+            Number of tasks added.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def lease(self, worker_id: str, count: int = 1) -> List[Lease]:
+        """Lease pending tasks or tasks with expired lease.
+
+        Args:
+            worker_id - identifier of the worker leasing tasks
+            count - maximum number of tasks to lease
+
+        Returns:
+            The list of leases, empty if there is nothing to do.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def renew(self, lease: Lease) -> bool:
+        """Extend the lease, returns False if it's lost already."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, task_id: str) -> bool:
+        """Mark the task as done.
+
+        Returns:
+            True if the task is completed by this call, False if it
+            had been completed before.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fail(self, lease: Lease, error: str) -> None:
+        """Return the task to the queue, or give up on it."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release(self, lease: Lease) -> None:
+        """Return the task to the queue, not counting it as a failure."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def requeue_failed(self) -> int:
+        """Return failed tasks to the queue, returns their number."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Number of tasks in every state."""
+        raise NotImplementedError
+
+
+class SqliteWorkQueue(WorkQueue):
+    """Work queue stored in a sqlite database file.
+
+    Task states are ''pending'', ''leased'', ''done'' and ''failed''.
+    """
+
+    def __init__(self, path: str, lease_timeout: float = 300.0,
+                 max_attempts: int = 3,
+                 clock: Callable[[], float] = time.time) -> None:
+        """Constructor.
+
+        Args:
+            path - database file path, created if doesn't exist
+            lease_timeout - seconds after which a lease expires
+            max_attempts - number of failures after which the task
+                is not handed out anymore
+            clock - function returning current time in seconds, it
+                must be the same on all machines sharing the queue
+        """
+        self._lease_timeout = lease_timeout
+        self._max_attempts = max_attempts
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=60, isolation_level=None,
+            check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            'id TEXT PRIMARY KEY, params TEXT NOT NULL, '
+            "state TEXT NOT NULL DEFAULT 'pending', worker TEXT, "
+            'token TEXT, lease_expires REAL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, error TEXT)')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS tasks_state '
+            'ON tasks (state, lease_expires)')
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._db.close()
+
+    def put(self, tasks: Iterable[Tuple[str, dict]]) -> int:
+        """Add tasks to the queue, see ''WorkQueue.put''."""
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO tasks (id, params) VALUES (?, ?)',
+                    ((task_id, json.dumps(params))
+                     for task_id, params in tasks))
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return self._db.total_changes - before
+
+    def lease(self, worker_id: str, count: int = 1) -> List[Lease]:
+        """Lease tasks, see ''WorkQueue.lease''."""
+        with self._lock:
+            now = self._clock()
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._db.execute(
+                    "SELECT id, params FROM tasks WHERE state = 'pending' "
+                    "OR (state = 'leased' AND lease_expires < ?) LIMIT ?",
+                    (now, count)).fetchall()
+                leases = []
+                for task_id, params in rows:
+                    token = uuid.uuid4().hex
+                    self._db.execute(
+                        "UPDATE tasks SET state = 'leased', worker = ?, "
+                        'token = ?, lease_expires = ? WHERE id = ?',
+                        (worker_id, token, now + self._lease_timeout,
+                         task_id))
+                    leases.append(Lease(task_id, json.loads(params), token))
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return leases
+
+    def renew(self, lease: Lease) -> bool:
+        """Extend the lease, see ''WorkQueue.renew''."""
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE tasks SET lease_expires = ? '
+                "WHERE id = ? AND token = ? AND state = 'leased'",
+                (self._clock() + self._lease_timeout,
+                 lease.task_id, lease.token))
+            return cursor.rowcount == 1
+
+    def complete(self, task_id: str) -> bool:
+        """Mark the task as done, see ''WorkQueue.complete''."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE tasks SET state = 'done', lease_expires = NULL "
+                "WHERE id = ? AND state != 'done'", (task_id,))
+            return cursor.rowcount == 1
+
+    def fail(self, lease: Lease, error: str) -> None:
+        """Return the task to the queue, see ''WorkQueue.fail''."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE tasks SET attempts = attempts + 1, error = ?, '
+                "state = CASE WHEN attempts + 1 >= ? THEN 'failed' "
+                "ELSE 'pending' END, lease_expires = NULL "
+                "WHERE id = ? AND token = ? AND state = 'leased'",
+                (error, self._max_attempts, lease.task_id, lease.token))
+
+    def release(self, lease: Lease) -> None:
+        """Return the task to the queue, see ''WorkQueue.release''."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET state = 'pending', lease_expires = NULL "
+                "WHERE id = ? AND token = ? AND state = 'leased'",
+                (lease.task_id, lease.token))
+
+    def requeue_failed(self) -> int:
+        """Return failed tasks, see ''WorkQueue.requeue_failed''."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE tasks SET state = 'pending', attempts = 0 "
+                "WHERE state = 'failed'")
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of tasks in every state, see ''WorkQueue.counts''."""
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT state, COUNT(*) FROM tasks GROUP BY state')
+            return dict(rows.fetchall())
+
+
+def run_worker(queue: WorkQueue, shard_path: str, worker_id: str = None,
+               api: RiaAPI = None, batch_size: int = 10,
+               backoff: float = 60.0, max_backoff: float = 3600.0,
+               sleep: Callable[[float], None] = time.sleep) -> int:
+    """Process tasks from the queue until it runs out of them.
+
+    Every result is appended to the shard file as a JSON line:
+        {"task_id": ..., "params": {...}, "average": {...}}
+    price sketch is attached to every average, so results can be
+    combined with ''autoria.sketch.merge_averages''.
+
+    Args:
+        queue - queue to take tasks from
+        shard_path - path to the file to append results to
+        worker_id - worker identifier, random one if not given
+        api - RiaAPI instance to make requests with,
+            ''CachingRiaAPI'' is created if not given
+        batch_size - number of tasks leased at once
+        backoff - seconds to wait after API quota is exceeded, the
+            wait is doubled while quota stays exceeded
+        max_backoff - the longest wait for API quota
+        sleep - function to wait with
+
+    Returns:
+        Number of tasks completed by this worker.
+    """
+    worker_id = worker_id or uuid.uuid4().hex
+    api = api if api is not None else CachingRiaAPI()
+    completed = 0
+    wait = backoff
+    with open(shard_path, 'a', encoding='utf-8') as shard:
+        while True:
+            leases = queue.lease(worker_id, batch_size)
+            if not leases:
+                return completed
+            for number, lease in enumerate(leases):
+                # Earlier searches of the batch may have taken long
+                if not queue.renew(lease):
+                    continue
+                try:
+                    average = RiaAverageCarPrice(
+                        api=api, **lease.params).get_average()
+                except QuotaExceeded:
+                    # Not a failure of the search, it's retried once
+                    # quota recovers, the rest of the batch too
+                    for unprocessed in leases[number:]:
+                        queue.release(unprocessed)
+                    sleep(wait)
+                    wait = min(wait * 2, max_backoff)
+                    break
+                except Exception as e:
+                    queue.fail(lease, str(e))
+                    continue
+                wait = backoff
+                # The result is written before completion, so a crash
+                # in between only leads to a duplicate in shards
+                shard.write(json.dumps({
+                    'task_id': lease.task_id,
+                    'params': lease.params,
+                    'average': attach_sketch(average),
+                }) + '\n')
+                shard.flush()
+                if queue.complete(lease.task_id):
+                    completed += 1
+
+
+def merge_shards(shard_paths: Iterable[str],
+                 output_path: str = None) -> Dict[str, dict]:
+    """Merge result shards written by workers.
+
+    Args:
+        shard_paths - paths to shard files
+        output_path - if given, merged results are written there
+            in the same JSON lines format
+
+    Returns:
+        Dictionary with task ids as keys and result records as values,
+        the first record is kept for repeated tasks.
+    """
+    results = {}  # type: Dict[str, dict]
+    for path in shard_paths:
+        with open(path, encoding='utf-8') as shard:
+            for line in shard:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A partially written line of a killed worker
+                    continue
+                results.setdefault(record['task_id'], record)
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf-8') as output:
+            for task_id in sorted(results):
+                output.write(json.dumps(results[task_id]) + '\n')
+    return results
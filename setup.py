@@ -31,6 +31,11 @@ setup(
     keywords='cars average price',
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
     python_requires='>=3.5',
+    entry_points={
+        'console_scripts': [
+            'autoria=autoria.__main__:main',
+        ],
+    },
     instal_requires=[
         'requests',
         'typing',
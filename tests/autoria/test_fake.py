@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from autoria.api import CachingRiaAPI, RiaAPI
+from autoria.fake import FakeCatalog, FakeRiaServer
+from autoria.keys import ApiKeyPool
+from autoria.loadtest import percentile, run_load_test
+
+
+@pytest.fixture()
+def fake_server():
+    server = FakeRiaServer(catalog=FakeCatalog(marks=5, models=3,
+                                               prices=(5, 10)),
+                           quota=100)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+class TestFakeServer:
+    """Tests for synthetic API server and load testing."""
+
+    def test_serves_catalog(self, fake_server):
+        """RiaAPI can be pointed at the fake server."""
+        api = RiaAPI(fake_server.url)
+        assert api.get_models(1, 3) == [
+            {'name': 'Model 2-0', 'value': 9},
+            {'name': 'Model 2-1', 'value': 10},
+            {'name': 'Model 2-2', 'value': 11},
+        ]
+        average = api.average_price({'api_key': 'key', 'model_id': 9})
+        assert average == api.average_price({'api_key': 'other',
+                                             'model_id': 9})
+        assert 5 <= average['total'] == len(average['prices']) <= 10
+
+    def test_quota(self, fake_server):
+        """Requests over the key quota are throttled."""
+        api = RiaAPI(fake_server.url)
+        for _ in range(100):
+            api.average_price({'api_key': 'key'})
+        with pytest.raises(Exception) as error:
+            api.average_price({'api_key': 'key'})
+        assert '429' in str(error.value)
+
+    def test_load_test(self, fake_server):
+        """All generated searches succeed against the fake server."""
+        searches = fake_server.catalog.searches(20)
+        for search in searches:
+            search['api_key'] = 'load'
+        report = run_load_test(CachingRiaAPI(fake_server.url), searches,
+                               concurrency=4)
+        assert report.searches == 20
+        assert report.errors == 0
+        assert report.latencies == sorted(report.latencies)
+
+    def test_load_test_throttling(self):
+        """Random throttling doesn't look like exhausted key quota."""
+        server = FakeRiaServer(catalog=FakeCatalog(marks=5, models=3,
+                                                   prices=(5, 10)),
+                               throttle_rate=0.05)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            pool = ApiKeyPool(['one', 'two', 'three'], cooldown=0)
+            report = run_load_test(CachingRiaAPI(server.url, pool),
+                                   server.catalog.searches(100))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        assert report.errors == 0
+        stats = pool.stats()
+        assert sum(key['requests'] for key in stats.values()) > 100
+        assert all(key['remaining'] is None for key in stats.values())
+
+    def test_percentile(self):
+        """Percentiles are interpolated between values."""
+        assert percentile([1, 2, 3, 4], 50) == 2.5
+        assert percentile([1, 2, 3, 4], 100) == 4
+        assert percentile([7], 90) == 7
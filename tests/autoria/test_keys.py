@@ -0,0 +1,85 @@
+import json
+
+import pytest
+import requests_mock
+
+from autoria.api import RiaAPI, RiaAverageCarPrice
+from autoria.keys import ApiKeyPool, QuotaExceeded
+
+
+class TestApiKeyPool:
+    """Tests for API key pool."""
+
+    def test_spreads_requests(self):
+        """Keys with unknown quota are used in turn."""
+        pool = ApiKeyPool(['one', 'two'])
+        used = []
+        for _ in range(4):
+            key = pool.acquire()
+            used.append(key)
+            pool.report(key, 200)
+        assert sorted(used) == ['one', 'one', 'two', 'two']
+
+    def test_skips_exhausted_and_throttled(self):
+        """Keys with no quota left or throttled are not picked."""
+        now = [0.0]
+        pool = ApiKeyPool(['one', 'two', 'three'], cooldown=10,
+                          clock=lambda: now[0])
+        pool.report(pool.acquire(), 200, remaining=0)
+        pool.report(pool.acquire(), 429)
+        assert pool.acquire() == 'three'
+        pool.report('three', 200, remaining=0)
+        with pytest.raises(QuotaExceeded) as error:
+            pool.acquire()
+        assert 'exhausted' in str(error.value)
+        now[0] = 11.0
+        assert pool.acquire() == 'two'
+
+    def test_quota_is_restored(self):
+        """Exhausted key is used again after the quota period."""
+        now = [0.0]
+        pool = ApiKeyPool(['one'], quota=2, quota_period=100,
+                          clock=lambda: now[0])
+        for _ in range(2):
+            pool.report(pool.acquire(), 200)
+        assert pool.stats()['one']['remaining'] == 0
+        with pytest.raises(QuotaExceeded):
+            pool.acquire()
+        now[0] = 101.0
+        assert pool.acquire() == 'one'
+        assert pool.stats()['one']['remaining'] == 2
+
+    def test_api_retries_throttled_key(self, ria_categories):
+        """Throttled request is retried with another key."""
+        pool = ApiKeyPool(['one', 'two'])
+        api = RiaAPI(key_pool=pool)
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', [
+                {'status_code': 429, 'text': 'Too many requests'},
+                {'text': json.dumps(ria_categories),
+                 'headers': {'X-RateLimit-Remaining': '99'}},
+            ])
+            assert api.get_categories() == ria_categories
+            keys = [r.qs['api_key'][0] for r in mock.request_history]
+        assert sorted(keys) == ['one', 'two']
+        stats = pool.stats()
+        assert stats[keys[1]]['remaining'] == 99
+        assert stats[keys[0]]['throttled_until'] > 0
+
+    def test_search_without_api_key(self, ria_categories, ria_marks,
+                                    ria_models, ria_average):
+        """Search takes its key from the pool, not from the caller."""
+        api = RiaAPI(key_pool=ApiKeyPool(['one']))
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', text=json.dumps(ria_categories))
+            mock.get('/categories/1/marks', text=json.dumps(ria_marks))
+            mock.get('/categories/1/marks/1/models',
+                     text=json.dumps(ria_models))
+            mock.get('/average', text=json.dumps(ria_average))
+            RiaAverageCarPrice(category='Легковые', mark='Renault',
+                               model='Scenic', api=api).get_average()
+            assert mock.last_request.qs['api_key'] == ['one']
+        with pytest.raises(Exception) as error:
+            RiaAverageCarPrice(category='Легковые', mark='Renault',
+                               model='Scenic')
+        assert 'api_key' in str(error.value)
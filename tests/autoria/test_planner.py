@@ -0,0 +1,109 @@
+import json
+import threading
+
+import requests_mock
+
+from autoria.api import CachingRiaAPI, RiaAPI, RiaAverageCarPrice
+from autoria.planner import ResolutionPlan
+
+
+class TestResolutionPlan:
+    """Tests for search parameters resolution planner."""
+
+    def test_explain(self):
+        """Plan shows requests and their dependencies."""
+        plan = ResolutionPlan(RiaAPI(), category='Легковые', mark='Renault',
+                              model='Scenic', state='Винницкая',
+                              city='Винница', color='Бежевый')
+        assert plan.requests == 6
+        assert plan.round_trips == 3
+        assert [step.name for step in plan.critical_path] == [
+            'category', 'mark', 'model']
+        explanation = plan.explain()
+        assert 'GET /states/{state}/cities -> city (after state)' \
+            in explanation
+        assert 'Critical path: /categories -> /categories/{category}/marks' \
+            in explanation
+
+    def test_given_identifiers_and_ignored_city(self):
+        """Identifiers are not looked up, city without state is ignored."""
+        plan = ResolutionPlan(RiaAPI(), category=1, mark=2, model='Scenic',
+                              city='Винница', api_key='key', years=[2010])
+        assert plan.requests == 1
+        assert plan.given == ['category', 'mark']
+        assert plan.ignored == ['city, because state is not given']
+        assert 'GET /categories/1/marks/2/models -> model' in plan.explain()
+
+    def test_cached_lists_are_skipped(self, ria_categories, ria_marks,
+                                      ria_models, ria_states, ria_cities,
+                                      ria_average):
+        """Search with cached reference data makes no extra requests."""
+        api = CachingRiaAPI()
+        search = dict(api_key='key', category='Легковые', mark='Renault',
+                      model='Scenic', state='Винницкая', city='Винница')
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', text=json.dumps(ria_categories))
+            mock.get('/categories/1/marks', text=json.dumps(ria_marks))
+            mock.get('/categories/1/marks/1/models',
+                     text=json.dumps(ria_models))
+            mock.get('/states', text=json.dumps(ria_states))
+            mock.get('/states/1/cities', text=json.dumps(ria_cities))
+            mock.get('/average', text=json.dumps(ria_average))
+            RiaAverageCarPrice(api=api, **search).get_average()
+            assert mock.call_count == 6
+            price = RiaAverageCarPrice(api=api, **search)
+            assert price.plan.requests == 0
+            assert price.plan.explain().startswith(
+                'Resolution plan: 0 requests in 0 round trips')
+            assert price.get_average() == ria_average
+            assert mock.call_count == 7
+            assert mock.last_request.qs['city_id'] == ['1']
+
+    def test_missing_dependency(self, ria_categories, ria_marks):
+        """Parameters depending on one which is not found are skipped."""
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', text=json.dumps(ria_categories))
+            mock.get('/categories/1/marks', text=json.dumps(ria_marks))
+            ids = ResolutionPlan(RiaAPI(), category='Легковые',
+                                 mark='Lada', model='Niva').execute()
+            # No request for /categories/1/marks/None/models is made
+            assert mock.call_count == 2
+        assert ids['main_category'] == 1
+        assert ids['marka_id'] is None
+        assert ids['model_id'] is None
+
+    def test_missing_cached_dependency(self, ria_categories, ria_marks):
+        """Lookups depending on a cached name not found are not planned."""
+        api = CachingRiaAPI()
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', text=json.dumps(ria_categories))
+            mock.get('/categories/1/marks', text=json.dumps(ria_marks))
+            api.get_marks(api.get_categories()[0]['value'])
+            plan = ResolutionPlan(api, category='Легковые', mark='Lada',
+                                  model='Niva')
+            assert plan.requests == 0
+            assert plan.ignored == ['model, because mark is not found']
+            assert 'None' not in plan.explain()
+            ids = plan.execute()
+            assert mock.call_count == 2
+        assert ids['marka_id'] is None
+        assert ids['model_id'] is None
+
+    def test_independent_steps_run_in_parallel(self, ria_categories,
+                                               ria_states):
+        """Independent lookups are waiting for each other at once."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        class SlowAPI(RiaAPI):
+            def get_categories(self):
+                barrier.wait()
+                return ria_categories
+
+            def get_states(self):
+                barrier.wait()
+                return ria_states
+
+        ids = ResolutionPlan(SlowAPI(), category='Легковые',
+                             state='Винницкая').execute()
+        assert ids['main_category'] == 1
+        assert ids['state_id'] == 1
@@ -0,0 +1,88 @@
+import json
+
+import requests_mock
+
+from autoria.api import CachingRiaAPI
+from autoria.scheduler import PollScheduler, result_change, search_poller
+
+
+class TestPollScheduler:
+    """Tests for adaptive saved search polling."""
+
+    def test_result_change(self, ria_average):
+        """Change is the largest of relative changes."""
+        assert result_change(ria_average, ria_average) == 0
+        changed = dict(ria_average, total=10,
+                       classifieds=ria_average['classifieds'][:4])
+        assert result_change(ria_average, changed) == 0.5
+
+    def test_intervals_follow_volatility(self):
+        """Stable searches are polled less, volatile ones more often."""
+        now = [0.0]
+        scheduler = PollScheduler(min_interval=10, max_interval=1000,
+                                  initial_interval=100, jitter=0,
+                                  clock=lambda: now[0], seed=0)
+        scheduler.add('stable', {})
+        scheduler.add('volatile', {})
+        prices = {'stable': 0, 'volatile': 0}
+
+        def poll(params):
+            return {'total': 1, 'arithmeticMean': params['price']}
+
+        for _ in range(5):
+            now[0] += 100
+            for search_id, _ in scheduler.due():
+                if search_id == 'volatile':
+                    prices[search_id] += 1000
+                scheduler.record(search_id, poll(
+                    {'price': 1000 + prices[search_id]}))
+            now[0] = scheduler.next_poll()
+        assert scheduler.stats('stable')['interval'] > 100
+        assert scheduler.stats('volatile')['interval'] < 100
+        assert scheduler.stats('volatile')['volatility'] > \
+            scheduler.stats('stable')['volatility']
+
+    def test_budget(self):
+        """Polls are charged their requests, volatile ones go first."""
+        now = [0.0]
+        scheduler = PollScheduler(min_interval=1, initial_interval=1,
+                                  budget=6, budget_period=60, jitter=0,
+                                  initial_cost=1, clock=lambda: now[0])
+        for search_id in 'abc':
+            scheduler.add(search_id, {})
+        now[0] = 1.0
+        assert len(scheduler.due()) == 3
+        for search_id in 'abc':
+            scheduler.record(search_id, {'total': 1}, requests=1)
+        now[0] = 2.0
+        assert len(scheduler.due()) == 3
+        for search_id in 'abc':
+            scheduler.record(search_id, {'total': 2 if search_id == 'c'
+                                         else 1}, requests=1)
+        assert scheduler.stats('c')['volatility'] > 0
+        # Budget is refilled for a single request only
+        now[0] = 12.5
+        assert scheduler.due() == [('c', {})]
+        # The poll turned out to cost 4 requests, so the budget is
+        # overdrawn and nothing is polled until it's refilled
+        scheduler.record('c', {'total': 3}, requests=4)
+        assert scheduler.stats('c')['cost'] == 4
+        now[0] = 42.5
+        assert scheduler.due() == []
+        now[0] = 52.5
+        assert scheduler.run_pending(lambda params: ({'total': 1}, 1)) == 1
+
+    def test_search_poller(self, ria_categories, ria_marks, ria_models,
+                           ria_average):
+        """Poller reports lookups and the average price request."""
+        poll = search_poller(CachingRiaAPI())
+        params = {'api_key': 'key', 'category': 'Легковые',
+                  'mark': 'Renault', 'model': 'Scenic'}
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', text=json.dumps(ria_categories))
+            mock.get('/categories/1/marks', text=json.dumps(ria_marks))
+            mock.get('/categories/1/marks/1/models',
+                     text=json.dumps(ria_models))
+            mock.get('/average', text=json.dumps(ria_average))
+            assert poll(params) == (ria_average, 4)
+            assert poll(params) == (ria_average, 1)
@@ -1,4 +1,6 @@
-from autoria.api import select_item
+import random
+
+from autoria.api import select_item, select_many
 
 
 class TestSelect:
@@ -15,3 +17,42 @@ class TestSelect:
         }]
         assert select_item('one', data) == 1
         assert select_item('two', data) == 2
+
+
+class TestSelectMany:
+    """Tests for ``select_many`` function."""
+
+    def test_same_as_select_item(self):
+        """Every item is selected the same way as by ``select_item``."""
+        data = [{'name': name, 'value': value} for value, name in enumerate([
+            'Харьков', 'Харьковская', 'Новый Харьков', 'Винница',
+            'Жмеринка', 'Ника', 'Винница'], 1)]
+        queries = ['Харьков', 'Харьковская', 'Харьк', 'ьков', 'Винница',
+                   'ник', 'Ник', 'инка', 'Киев', 'Винн*', '*ков?']
+        expected = [select_item(query, data) for query in queries]
+        assert select_many(queries, data) == expected
+        assert expected[-1] == 2
+
+    def test_normalize_and_missing(self):
+        """Items are normalized, missing ones are replaced by sentinel."""
+        data = [{'name': 'Mazda', 'value': 47}, {'name': 'Renault',
+                                                 'value': 62}]
+        assert select_many([' Renault', 'Mazda ', 'Lada', None, '', 'Ren'],
+                           data, missing=-1) == [62, 47, -1, -1, -1, 62]
+        assert select_many(['Mazda'], None) == [None]
+
+    def test_many_unique_items(self):
+        """Indexed lookups find the same names as ``select_item``."""
+        rnd = random.Random(0)
+
+        def word(length):
+            return ''.join(rnd.choice('abcд ') for _ in range(length))
+
+        data = [{'name': word(rnd.randint(1, 8)), 'value': value}
+                for value in range(300)]
+        queries = [query for query in (
+            word(rnd.randint(1, 5)) for _ in range(1000)) if query.strip()]
+        expected = [select_item(query.strip(), data) for query in queries]
+        assert select_many(queries, data) == expected
+        assert len(set(expected)) > 50
+        assert None in expected
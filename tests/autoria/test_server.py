@@ -0,0 +1,92 @@
+import json
+import threading
+
+import pytest
+import requests_mock
+
+from autoria.api import CachingRiaAPI, RiaAPI
+from autoria.server import RiaClient, RiaServer
+
+
+@pytest.fixture()
+def start_server():
+    servers = []
+
+    def start(api):
+        server = RiaServer(('127.0.0.1', 0), api=api)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        servers.append((server, thread))
+        return server
+
+    yield start
+    for server, thread in servers:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+class TestServer:
+    """Tests for warm average price server."""
+
+    def test_average_reuses_reference_data(self, start_server,
+                                           ria_categories, ria_marks,
+                                           ria_models, ria_average):
+        """Reference data is fetched only once for repeated searches."""
+        server = start_server(CachingRiaAPI())
+        with requests_mock.Mocker(real_http=True) as mock:
+            categories = mock.get('http://api.auto.ria.com/categories',
+                                  text=json.dumps(ria_categories))
+            mock.get('http://api.auto.ria.com/categories/1/marks',
+                     text=json.dumps(ria_marks))
+            mock.get('http://api.auto.ria.com/categories/1/marks/1/models',
+                     text=json.dumps(ria_models))
+            average = mock.get('http://api.auto.ria.com/average',
+                               text=json.dumps(ria_average))
+            client = RiaClient(server.url)
+            assert client.health()
+            for _ in range(2):
+                result = client.average(api_key='key', category='Легковые',
+                                        mark='Renault', model='Scenic')
+                assert result == ria_average
+            assert categories.call_count == 1
+            assert average.call_count == 2
+
+    def test_average_bad_arguments(self, start_server):
+        """Unknown search arguments are reported as a client error."""
+        server = start_server(CachingRiaAPI())
+        with pytest.raises(Exception) as error:
+            RiaClient(server.url).average(colour='Бежевый')
+        assert '400' in str(error.value)
+
+    def test_internal_error(self, start_server):
+        """Errors inside of the search are not reported as client ones."""
+        class BrokenAPI(RiaAPI):
+            def get_categories(self):
+                raise TypeError('internal bug')
+
+        server = start_server(BrokenAPI())
+        with pytest.raises(Exception) as error:
+            RiaClient(server.url).average(api_key='key', category='Легковые',
+                                          mark='Renault', model='Scenic')
+        assert '502' in str(error.value)
+
+    def test_refresh(self, start_server, ria_categories):
+        """Reference data is fetched again after refresh or TTL."""
+        now = [0.0]
+        api = CachingRiaAPI(ttl=60, clock=lambda: now[0])
+        server = start_server(api)
+        with requests_mock.Mocker(real_http=True) as mock:
+            categories = mock.get('http://api.auto.ria.com/categories',
+                                  text=json.dumps(ria_categories))
+            api.get_categories()
+            api.get_categories()
+            assert categories.call_count == 1
+            RiaClient(server.url).refresh()
+            assert not api.is_cached('/categories')
+            api.get_categories()
+            assert categories.call_count == 2
+            now[0] = 61.0
+            assert not api.is_cached('/categories')
+            api.get_categories()
+            assert categories.call_count == 3
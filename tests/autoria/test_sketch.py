@@ -0,0 +1,60 @@
+import json
+import random
+
+from autoria.sketch import PriceSketch, attach_sketch, merge_averages
+
+
+def exact_percentile(prices, q):
+    """Percentile of sorted prices, interpolated between the two closest."""
+    position = (len(prices) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(prices) - 1)
+    return prices[lower] + (prices[upper] - prices[lower]) * (
+        position - lower)
+
+
+class TestSketch:
+    """Tests for mergeable price sketches."""
+
+    def test_small_sketch_is_exact(self, ria_average):
+        """Sketch of few prices gives exact results."""
+        merged = merge_averages([ria_average])
+        prices = sorted(ria_average['prices'])
+        assert merged['total'] == ria_average['total']
+        assert merged['arithmeticMean'] == sum(prices) / len(prices)
+        assert merged['interQuartileMean'] == sum(prices[2:6]) / 4
+        assert merged['percentiles']['50.0'] == exact_percentile(prices, 50)
+
+    def test_merge_accuracy(self):
+        """Merged sketches are close to exact percentiles of all prices."""
+        rnd = random.Random(0)
+        averages = []
+        prices = []
+        for _ in range(50):
+            state_prices = [rnd.lognormvariate(9, 0.4) for _ in range(400)]
+            prices.extend(state_prices)
+            # Serialize the way results are stored
+            averages.append(json.loads(json.dumps(
+                attach_sketch({'prices': state_prices}))))
+        merged = merge_averages(averages)
+        prices.sort()
+        assert merged['total'] == len(prices)
+        assert len(merged['sketch']['centroids']) <= 100
+        for q in (1.0, 5.0, 25.0, 50.0, 75.0, 95.0, 99.0):
+            exact = exact_percentile(prices, q)
+            estimate = merged['percentiles'][str(q)]
+            assert abs(estimate - exact) / exact < 0.01
+        quarter = len(prices) // 4
+        exact = sum(prices[quarter:-quarter]) / (len(prices) - 2 * quarter)
+        assert abs(merged['interQuartileMean'] - exact) / exact < 0.001
+
+    def test_empty(self):
+        """Empty sketch can be serialized and merged."""
+        sketch = PriceSketch.from_dict(PriceSketch().to_dict())
+        sketch.merge(PriceSketch())
+        assert sketch.count == 0
+        merged = json.loads(json.dumps(merge_averages([]), allow_nan=False))
+        assert merged['total'] == 0
+        assert merged['arithmeticMean'] is None
+        assert merged['interQuartileMean'] is None
+        assert set(merged['percentiles'].values()) == {None}
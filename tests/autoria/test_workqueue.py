@@ -0,0 +1,98 @@
+import json
+
+import requests_mock
+
+import pytest
+
+from autoria.workqueue import (SqliteWorkQueue, WorkQueue, merge_shards,
+                               run_worker)
+
+
+class TestWorkQueue:
+    """Tests for distributed work queue."""
+
+    def test_expired_lease_is_reassigned(self, tmpdir):
+        """Tasks of a dead worker are leased again after timeout."""
+        now = [0.0]
+        queue = SqliteWorkQueue(str(tmpdir.join('queue.db')),
+                                lease_timeout=10, clock=lambda: now[0])
+        assert queue.put([('a', {}), ('b', {}), ('a', {})]) == 2
+        assert len(queue.lease('dead', 2)) == 2
+        assert queue.lease('alive') == []
+        now[0] = 11.0
+        leases = queue.lease('alive', 5)
+        assert sorted(lease.task_id for lease in leases) == ['a', 'b']
+        assert queue.complete('a')
+        assert not queue.complete('a')
+        assert queue.counts() == {'done': 1, 'leased': 1}
+
+    def test_failed_task_is_retried(self, tmpdir):
+        """Failed task returns to the queue until attempts run out."""
+        queue = SqliteWorkQueue(str(tmpdir.join('queue.db')),
+                                max_attempts=2)
+        queue.put([('a', {})])
+        queue.fail(queue.lease('worker')[0], 'error')
+        assert queue.counts() == {'pending': 1}
+        queue.fail(queue.lease('worker')[0], 'error')
+        assert queue.counts() == {'failed': 1}
+        assert queue.lease('worker') == []
+        assert queue.requeue_failed() == 1
+        assert queue.counts() == {'pending': 1}
+
+    def test_incomplete_backend(self):
+        """Backend missing a method can't be created."""
+        class IncompleteQueue(WorkQueue):
+            def put(self, tasks):
+                return 0
+
+        with pytest.raises(TypeError):
+            IncompleteQueue()
+
+    def test_quota_exceeded_backs_off(self, tmpdir, ria_categories,
+                                      ria_marks, ria_models, ria_average):
+        """Throttled searches are retried after a pause, not failed."""
+        queue = SqliteWorkQueue(str(tmpdir.join('queue.db')))
+        params = {'api_key': 'key', 'category': 'Легковые',
+                  'mark': 'Renault', 'model': 'Scenic'}
+        queue.put([(str(i), params) for i in range(3)])
+        waits = []
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', text=json.dumps(ria_categories))
+            mock.get('/categories/1/marks', text=json.dumps(ria_marks))
+            mock.get('/categories/1/marks/1/models',
+                     text=json.dumps(ria_models))
+            throttled = {'status_code': 429, 'text': 'Too many requests'}
+            mock.get('/average', [throttled, throttled,
+                                  {'text': json.dumps(ria_average)}])
+            assert run_worker(queue, str(tmpdir.join('shard.jsonl')),
+                              backoff=1, sleep=waits.append) == 3
+        assert waits == [1, 2]
+        assert queue.counts() == {'done': 3}
+
+    def test_workers_and_merge(self, tmpdir, ria_categories, ria_marks,
+                               ria_models, ria_average):
+        """Results of all workers are merged without duplicates."""
+        queue = SqliteWorkQueue(str(tmpdir.join('queue.db')))
+        params = {'api_key': 'key', 'category': 'Легковые',
+                  'mark': 'Renault', 'model': 'Scenic'}
+        queue.put([(str(i), params) for i in range(5)])
+        shards = [str(tmpdir.join('one.jsonl')), str(tmpdir.join('two.jsonl'))]
+        with requests_mock.Mocker() as mock:
+            mock.get('/categories', text=json.dumps(ria_categories))
+            mock.get('/categories/1/marks', text=json.dumps(ria_marks))
+            mock.get('/categories/1/marks/1/models',
+                     text=json.dumps(ria_models))
+            mock.get('/average', text=json.dumps(ria_average))
+            assert run_worker(queue, shards[0], batch_size=2) == 5
+            assert run_worker(queue, shards[1]) == 0
+        # A duplicate left by a worker killed before completion
+        with open(shards[1], 'w') as shard:
+            shard.write(json.dumps({'task_id': '0', 'params': params,
+                                    'average': {}}) + '\n{"task_')
+        output = str(tmpdir.join('merged.jsonl'))
+        results = merge_shards(shards, output)
+        assert sorted(results) == ['0', '1', '2', '3', '4']
+        assert results['0']['average']['prices'] == ria_average['prices']
+        assert results['0']['average']['sketch']
+        with open(output) as merged:
+            assert len(merged.readlines()) == 5